@@ -4,32 +4,55 @@ Screenshot Collector for Facebook Marketplace Listings
 Captures screenshots of all listing URLs to fill in the gaps
 """
 
-import json
 import asyncio
 import os
+import sys
 from datetime import datetime
 from playwright.async_api import async_playwright
 import logging
 
+# Helpers shared with the collectors in scripts/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scripts'))
+from rate_limiter import RateLimiter
+import json_io
+
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+VIEWPORT = {"width": 1200, "height": 800}
+
+# Not needed for a listing screenshot; stylesheets and images stay so the page renders
+BLOCKED_RESOURCE_TYPES = {'font', 'media', 'other'}
+
+# Rendered once the listing detail has loaded
+PRIMARY_SELECTOR = '[data-testid="marketplace_pdp_container"], h1'
+
 class ScreenshotCollector:
-    def __init__(self, input_file, output_dir="screenshots"):
+    def __init__(self, input_file, output_dir="screenshots", concurrency=3, recycle_after=50, full_page=False):
         self.input_file = input_file
         self.output_dir = output_dir
         self.screenshot_count = 0
         self.failed_count = 0
         
+        # Browser context pool settings
+        self.concurrency = concurrency  # Conservative, avoid overwhelming Facebook
+        self.recycle_after = recycle_after  # Listings per context before it is replaced
+        
+        # Paces navigations across all workers instead of pausing between batches
+        self.rate_limiter = RateLimiter(rate=1.0, burst=concurrency)
+        
+        # Full-page rasterization is expensive; the viewport covers the listing details
+        self.full_page = full_page
+        
         # Create output directory
         os.makedirs(output_dir, exist_ok=True)
         
     async def load_listings(self):
         """Load listings from JSON file"""
         try:
-            with open(self.input_file, 'r') as f:
-                data = json.load(f)
+            with open(self.input_file, 'rb') as f:
+                data = json_io.loads(f.read())
                 
             # Handle both direct array and wrapper object
             if isinstance(data, dict) and 'data' in data:
@@ -44,8 +67,43 @@ class ScreenshotCollector:
             logger.error(f"Error loading listings: {e}")
             return []
     
-    async def screenshot_listing(self, browser, listing):
-        """Take screenshot of a single listing"""
+    async def _new_slot(self, browser):
+        """Create a browser context with a single reusable page"""
+        context = await browser.new_context(viewport=VIEWPORT)
+        await context.route('**/*', self._route_request)
+        page = await context.new_page()
+        page.set_default_navigation_timeout(15000)
+        return {'context': context, 'page': page, 'uses': 0}
+    
+    async def _route_request(self, route):
+        """Abort requests for resource types the screenshot doesn't need"""
+        if route.request.resource_type in BLOCKED_RESOURCE_TYPES:
+            await route.abort()
+        else:
+            await route.continue_()
+    
+    async def _release_slot(self, browser, pool, slot):
+        """Return a context to the pool, recycling it once it has been used enough"""
+        slot['uses'] += 1
+        
+        if slot['uses'] >= self.recycle_after:
+            # Fresh context bounds heap growth on long runs
+            try:
+                fresh = await self._new_slot(browser)
+            except Exception as e:
+                # Keep the old context rather than shrinking the pool; retried on its next release
+                logger.warning(f"⚠️ Could not recycle browser context: {e}")
+            else:
+                try:
+                    await slot['context'].close()
+                except Exception as e:
+                    logger.warning(f"⚠️ Could not close browser context: {e}")
+                slot = fresh
+        
+        pool.put_nowait(slot)
+    
+    async def screenshot_listing(self, page, listing):
+        """Take screenshot of a single listing using a pooled page"""
         url = listing.get('url', '')
         title = listing.get('title', 'Unknown')
         listing_id = listing.get('id', 'unknown')
@@ -55,18 +113,16 @@ class ScreenshotCollector:
             return False
             
         try:
-            # Create new page
-            page = await browser.new_page()
-            
-            # Set viewport for consistent screenshots
-            await page.set_viewport_size({"width": 1200, "height": 800})
-            
             # Navigate to URL with timeout
+            await self.rate_limiter.acquire()
             logger.info(f"📸 Capturing: {title[:60]}...")
-            await page.goto(url, wait_until='networkidle', timeout=30000)
+            await page.goto(url, wait_until='domcontentloaded')
             
-            # Wait for content to load
-            await page.wait_for_timeout(3000)
+            # Wait for the listing content rather than network idle
+            try:
+                await page.wait_for_selector(PRIMARY_SELECTOR, state='visible', timeout=8000)
+            except Exception:
+                await page.wait_for_load_state('domcontentloaded')
             
             # Generate filename
             safe_title = "".join(c for c in title if c.isalnum() or c in (' ', '-', '_')).rstrip()[:50]
@@ -75,10 +131,7 @@ class ScreenshotCollector:
             filepath = os.path.join(self.output_dir, filename)
             
             # Take screenshot
-            await page.screenshot(path=filepath, full_page=True)
-            
-            # Close page to free memory
-            await page.close()
+            await page.screenshot(path=filepath, full_page=self.full_page)
             
             self.screenshot_count += 1
             logger.info(f"✅ Screenshot saved: {filename}")
@@ -87,8 +140,6 @@ class ScreenshotCollector:
         except Exception as e:
             self.failed_count += 1
             logger.error(f"❌ Failed to screenshot {title}: {e}")
-            if 'page' in locals():
-                await page.close()
             return False
     
     async def collect_all_screenshots(self):
@@ -110,24 +161,36 @@ class ScreenshotCollector:
                 args=['--no-sandbox', '--disable-setuid-sandbox']
             )
             
+            # One context per concurrency slot, rented out through a bounded queue
+            pool = asyncio.Queue(maxsize=self.concurrency)
+            
+            async def worker(listing):
+                slot = await pool.get()
+                try:
+                    if not await self.screenshot_listing(slot['page'], listing):
+                        # Page may be left in a bad state, replace it on release
+                        slot['uses'] = self.recycle_after
+                except Exception as e:
+                    # One bad listing must not cancel the rest of the run
+                    self.failed_count += 1
+                    slot['uses'] = self.recycle_after
+                    logger.error(f"❌ Failed to process {listing.get('title', 'Unknown')}: {e}")
+                finally:
+                    await self._release_slot(browser, pool, slot)
+            
             try:
-                # Process listings in batches to avoid overwhelming Facebook
-                batch_size = 3  # Conservative batch size
-                for i in range(0, len(listings), batch_size):
-                    batch = listings[i:i + batch_size]
-                    
-                    logger.info(f"📦 Processing batch {i//batch_size + 1}/{(len(listings) + batch_size - 1)//batch_size}")
-                    
-                    # Process batch
-                    tasks = [self.screenshot_listing(browser, listing) for listing in batch]
-                    await asyncio.gather(*tasks, return_exceptions=True)
-                    
-                    # Wait between batches to be respectful
-                    if i + batch_size < len(listings):
-                        logger.info("⏳ Waiting between batches...")
-                        await asyncio.sleep(5)
+                for _ in range(self.concurrency):
+                    pool.put_nowait(await self._new_slot(browser))
+                
+                # Each worker picks up the next listing as soon as a context frees up
+                logger.info(f"📦 Processing with {self.concurrency} browser contexts")
+                async with asyncio.TaskGroup() as tg:
+                    for listing in listings:
+                        tg.create_task(worker(listing))
                         
             finally:
+                while not pool.empty():
+                    await pool.get_nowait()['context'].close()
                 await browser.close()
         
         # Summary
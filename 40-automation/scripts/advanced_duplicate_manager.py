@@ -5,14 +5,41 @@ Handles complex scenarios like price changes, re-listings, and tracking history
 """
 
 import json
-import hashlib
-import difflib
-from datetime import datetime, timedelta
+import os
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime
+from functools import lru_cache
 import re
 import logging
+import xxhash
+from rapidfuzz import fuzz
+import json_io
 
 logger = logging.getLogger(__name__)
 
+# Stored with each entry so fingerprints from an older scheme get rebuilt on load
+FINGERPRINT_ALGO = 'xxh3_64-v2'
+
+_RE_MP = re.compile(r'\(\d+\)\s*Marketplace\s*-\s*')
+_RE_FB = re.compile(r'\|\s*Facebook$')
+_RE_YEAR = re.compile(r'(20\d{2}|19\d{2})')
+_RE_MODEL_TRIM = re.compile(r'(vx|fx|gp|gtr|gtx|gti|rxt|svho|cruiser|deluxe|wake|pro)')
+_RE_MODEL_LINE = re.compile(r'(superjet|waverunner|jetski)')
+
+# Fingerprint type -> indexed column in the listings table
+FP_COLUMNS = {
+    'exact': 'fp_exact',
+    'content': 'fp_content',
+    'item': 'fp_item',
+    'images': 'fp_images',
+    'seller_item': 'fp_seller_item'
+}
+
+def _h(data):
+    """64-bit non-cryptographic hash as 16 hex chars"""
+    return xxhash.xxh3_64_hexdigest(data.encode())
+
 class AdvancedDuplicateManager:
     """
     Sophisticated duplicate detection that handles:
@@ -24,125 +51,144 @@ class AdvancedDuplicateManager:
     6. Historical tracking
     """
     
-    def __init__(self):
-        self.duplicate_db = "duplicate_database.json"
-        self.price_history_db = "price_history_database.json"
+    def __init__(self, db_path="duplicate_database.db"):
+        self.db_path = db_path
         self.similarity_threshold = 0.85
+        self.early_exit_confidence = 0.95
+        
+        # Earlier JSON stores, imported once into an empty database
+        self.legacy_duplicate_db = "duplicate_database.json"
+        self.legacy_price_history_db = "price_history_database.json"
+        
+        # Autocommit; batches open their own transaction
+        self.conn = sqlite3.connect(self.db_path, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        
+        self._create_schema()
+        self._import_legacy_json()
+        self._refresh_stale_fingerprints()
         
     def create_composite_fingerprint(self, listing_data):
         """
         Create multiple fingerprints for different matching strategies
         Returns dict with different fingerprint types
         """
+        return dict(self.iter_fingerprints(listing_data))
+    
+    def iter_fingerprints(self, listing_data):
+        """
+        Lazily yield (fingerprint_type, value) pairs, strongest match type first,
+        so callers can stop once a confident match is found
+        """
         title = listing_data.get('title', '')
         description = listing_data.get('description', '')
         price = listing_data.get('price')
         location = listing_data.get('location', '')
         images = listing_data.get('images', [])
         
-        fingerprints = {
-            # Exact match - for identical listings
-            'exact': self._create_exact_fingerprint(title, description, price, location),
-            
-            # Content match - ignores price changes
-            'content': self._create_content_fingerprint(title, description, location),
-            
-            # Item match - core item identity (make/model/year)
-            'item': self._create_item_fingerprint(title),
-            
-            # Image match - based on image signatures
-            'images': self._create_image_fingerprint(images),
-            
-            # Seller + item match
-            'seller_item': self._create_seller_item_fingerprint(listing_data),
-        }
+        # Normalize once, shared by every fingerprint below
+        norm_title = self._normalize_text(title)
+        norm_description = self._normalize_text(description)
         
-        return fingerprints
+        # Exact match - for identical listings
+        yield 'exact', self._create_exact_fingerprint(norm_title, norm_description, price, location)
+        
+        # Content match - ignores price changes
+        yield 'content', self._create_content_fingerprint(norm_title, norm_description, location)
+        
+        # Seller + item match
+        item_id = self._create_item_fingerprint(norm_title)
+        yield 'seller_item', self._create_seller_item_fingerprint(listing_data.get('seller', ''), item_id, location)
+        
+        # Image match - based on image signatures
+        yield 'images', self._create_image_fingerprint(images)
+        
+        # Item match - core item identity (make/model/year)
+        yield 'item', item_id
     
-    def _create_exact_fingerprint(self, title, description, price, location):
+    def _create_exact_fingerprint(self, norm_title, norm_description, price, location):
         """Exact match including price and description"""
-        data = f"{self._normalize_text(title)}{self._normalize_text(description)}{price}{location}"
-        return hashlib.md5(data.encode()).hexdigest()[:16]
+        data = f"{norm_title}{norm_description}{price}{location}"
+        return _h(data)
     
-    def _create_content_fingerprint(self, title, description, location):
+    def _create_content_fingerprint(self, norm_title, norm_description, location):
         """Content match ignoring price"""
-        data = f"{self._normalize_text(title)}{self._normalize_text(description)}{location}"
-        return hashlib.md5(data.encode()).hexdigest()[:16]
+        data = f"{norm_title}{norm_description}{location}"
+        return _h(data)
     
-    def _create_item_fingerprint(self, title):
+    def _create_item_fingerprint(self, norm_title):
         """Core item identity - make, model, year"""
-        normalized = self._normalize_text(title)
-        
         # Extract key identifiers
-        make_model_year = self._extract_make_model_year(normalized)
+        make_model_year = self._extract_make_model_year(norm_title)
         
         # Create fingerprint from core attributes
-        data = f"{make_model_year['make']}{make_model_year['model']}{make_model_year['year']}"
-        return hashlib.md5(data.encode()).hexdigest()[:16]
+        data = ''.join(make_model_year)
+        return _h(data)
     
     def _create_image_fingerprint(self, images):
         """Create fingerprint from image URLs/hashes"""
         if not images:
             return None
         
-        # Sort images for consistent fingerprinting
-        image_urls = sorted([img for img in images if img])
-        image_data = ''.join(image_urls)
-        return hashlib.md5(image_data.encode()).hexdigest()[:16]
+        image_urls = sorted(filter(None, images))
+        if not image_urls:
+            return None
+        
+        # Hash in sorted order with a separator so ['ab', 'c'] != ['a', 'bc']
+        h = xxhash.xxh3_64()
+        for url in image_urls:
+            h.update(url.encode())
+            h.update(b'\x00')
+        return h.hexdigest()
     
-    def _create_seller_item_fingerprint(self, listing_data):
+    def _create_seller_item_fingerprint(self, seller, item_id, location):
         """Fingerprint combining seller and item info"""
-        seller = listing_data.get('seller', '')
-        title = listing_data.get('title', '')
-        location = listing_data.get('location', '')
-        
         # Extract seller identifier (could be name, profile, etc.)
         seller_id = self._extract_seller_identifier(seller)
-        item_id = self._create_item_fingerprint(title)
         
         data = f"{seller_id}{item_id}{location}"
-        return hashlib.md5(data.encode()).hexdigest()[:16]
+        return _h(data)
     
-    def _extract_make_model_year(self, title):
-        """Extract make, model, year from title"""
+    @staticmethod
+    @lru_cache(maxsize=4096)
+    def _extract_make_model_year(title):
+        """Extract (make, model, year) from title"""
         title_lower = title.lower()
         
         # Common makes
-        makes = ['yamaha', 'sea-doo', 'seadoo', 'kawasaki', 'honda', 'polaris']
+        makes = ('yamaha', 'sea-doo', 'seadoo', 'kawasaki', 'honda', 'polaris')
         make = next((m for m in makes if m in title_lower), 'unknown')
         
         # Year extraction (4-digit years)
-        year_match = re.search(r'(20\d{2}|19\d{2})', title)
+        year_match = _RE_YEAR.search(title)
         year = year_match.group(1) if year_match else 'unknown'
         
         # Model extraction (after make, before year)
-        model_patterns = [
-            r'(vx|fx|gp|gtr|gtx|gti|rxt|svho|cruiser|deluxe|wake|pro)',
-            r'(superjet|waverunner|jetski)'
-        ]
-        
         model = 'unknown'
-        for pattern in model_patterns:
-            model_match = re.search(pattern, title_lower)
+        for pattern in (_RE_MODEL_TRIM, _RE_MODEL_LINE):
+            model_match = pattern.search(title_lower)
             if model_match:
                 model = model_match.group(1)
                 break
         
-        return {'make': make, 'model': model, 'year': year}
+        return (make, model, year)
     
     def _extract_seller_identifier(self, seller_data):
         """Extract stable seller identifier"""
         # This could be enhanced to extract profile IDs, names, etc.
         return self._normalize_text(seller_data) if seller_data else 'unknown'
     
-    def _normalize_text(self, text):
+    @staticmethod
+    @lru_cache(maxsize=4096)
+    def _normalize_text(text):
         """Normalize text for consistent comparison"""
         if not text:
             return ''
         
         # Remove common marketplace prefixes
-        text = re.sub(r'\(\d+\)\s*Marketplace\s*-\s*', '', text)
-        text = re.sub(r'\|\s*Facebook$', '', text)
+        text = _RE_MP.sub('', text)
+        text = _RE_FB.sub('', text)
         
         # Normalize whitespace and case
         text = ' '.join(text.lower().split())
@@ -154,9 +200,32 @@ class AdvancedDuplicateManager:
         Main duplicate detection method
         Returns comprehensive duplicate analysis
         """
-        fingerprints = self.create_composite_fingerprint(new_listing)
-        duplicate_db = self._load_duplicate_db()
+        results, _ = self._check_duplicates(new_listing, datetime.now())
+        return results
+    
+    def find_duplicates_batch(self, listings):
+        """
+        Duplicate detection for a whole import batch
+        Runs in one transaction, adds each new listing as it goes (so repeats
+        within the batch are caught too) and returns results in input order
+        """
+        now = datetime.now()
         
+        batch_results = []
+        with self._transaction():
+            for listing in listings:
+                results, fingerprints = self._check_duplicates(listing, now)
+                if not results['is_duplicate']:
+                    results['listing_id'] = self._store_new_listing(listing, fingerprints, datetime.now())
+                batch_results.append(results)
+        
+        return batch_results
+    
+    def _check_duplicates(self, new_listing, now):
+        """
+        Match one listing against the stored listings
+        Returns (results, fingerprints computed along the way)
+        """
         results = {
             'is_duplicate': False,
             'match_type': None,
@@ -168,23 +237,51 @@ class AdvancedDuplicateManager:
             'image_change_detected': False
         }
         
-        # Check each fingerprint type
-        for fp_type, fp_value in fingerprints.items():
+        # Same URL with nothing changed - skip fingerprinting entirely
+        url_match = self._find_match_by_url(new_listing.get('url'))
+        if url_match:
+            changes = self._detect_changes(new_listing, url_match)
+            if not (changes['price_changed'] or changes['content_changed'] or changes['images_changed']):
+                results.update({
+                    'is_duplicate': True,
+                    'match_type': 'url',
+                    'confidence': 1.0,
+                    'matched_listings': [{
+                        'fingerprint_type': 'url',
+                        'matched_listing_id': url_match['listing_id'],
+                        'original_url': url_match['original_url'],
+                        'confidence': 1.0,
+                        'changes_detected': changes
+                    }],
+                    'recommended_action': 'skip_duplicate'
+                })
+                return results, None
+        
+        # Check each fingerprint type, strongest first
+        fingerprints = {}
+        for fp_type, fp_value in self.iter_fingerprints(new_listing):
+            fingerprints[fp_type] = fp_value
             if not fp_value:
                 continue
                 
-            matches = self._find_matches_by_fingerprint(fp_type, fp_value, duplicate_db)
+            matches = self._find_matches_by_fingerprint(fp_type, fp_value)
             
             for match in matches:
                 match_info = {
                     'fingerprint_type': fp_type,
                     'matched_listing_id': match['listing_id'],
                     'original_url': match['original_url'],
-                    'confidence': self._calculate_confidence(fp_type, new_listing, match),
+                    'confidence': self._calculate_confidence(fp_type, new_listing, match, now),
                     'changes_detected': self._detect_changes(new_listing, match)
                 }
                 
                 results['matched_listings'].append(match_info)
+            
+            # An exact or near-certain match is good enough, skip the weaker fingerprints
+            if matches:
+                best_confidence = max(m['confidence'] for m in results['matched_listings'])
+                if fp_type == 'exact' or best_confidence >= self.early_exit_confidence:
+                    break
         
         if results['matched_listings']:
             results['is_duplicate'] = True
@@ -208,21 +305,23 @@ class AdvancedDuplicateManager:
             else:
                 results['recommended_action'] = 'skip_duplicate'
         
-        return results
+        return results, fingerprints
     
-    def _find_matches_by_fingerprint(self, fp_type, fp_value, db):
+    def _find_matches_by_fingerprint(self, fp_type, fp_value):
         """Find all matches for a specific fingerprint type"""
-        matches = []
-        
-        for listing_id, listing_data in db.items():
-            stored_fps = listing_data.get('fingerprints', {})
-            
-            if fp_type in stored_fps and stored_fps[fp_type] == fp_value:
-                matches.append(listing_data)
-        
-        return matches
+        rows = self.conn.execute(
+            f"SELECT * FROM listings WHERE {FP_COLUMNS[fp_type]} = ?", (fp_value,)
+        ).fetchall()
+        return [self._row_to_entry(row) for row in rows]
     
-    def _calculate_confidence(self, fp_type, new_listing, stored_listing):
+    def _find_match_by_url(self, url):
+        """Find the stored listing previously seen at this URL"""
+        if not url:
+            return None
+        row = self.conn.execute("SELECT * FROM listings WHERE url = ? LIMIT 1", (url,)).fetchone()
+        return self._row_to_entry(row) if row else None
+    
+    def _calculate_confidence(self, fp_type, new_listing, stored_listing, now):
         """Calculate confidence score for a match"""
         confidence_weights = {
             'exact': 1.0,
@@ -235,38 +334,49 @@ class AdvancedDuplicateManager:
         base_confidence = confidence_weights.get(fp_type, 0.5)
         
         # Additional factors
-        title_similarity = difflib.SequenceMatcher(
-            None, 
+        title_similarity = fuzz.token_set_ratio(
             new_listing.get('title', '').lower(),
             stored_listing.get('title', '').lower()
-        ).ratio()
+        ) / 100.0
         
         # Time factor - recent listings more likely to be re-listings
-        time_factor = self._calculate_time_factor(stored_listing.get('last_seen'))
+        last_seen = self._parse_timestamp(stored_listing.get('last_seen'))
+        time_factor = self._calculate_time_factor(last_seen, now)
         
         final_confidence = base_confidence * 0.7 + title_similarity * 0.2 + time_factor * 0.1
         
         return min(final_confidence, 1.0)
     
-    def _calculate_time_factor(self, last_seen_str):
-        """Calculate time-based confidence factor"""
+    @staticmethod
+    @lru_cache(maxsize=4096)
+    def _parse_timestamp(timestamp_str):
+        """Parse a stored ISO timestamp, None if missing or malformed"""
         try:
-            last_seen = datetime.fromisoformat(last_seen_str.replace('Z', '+00:00'))
-            time_diff = datetime.now() - last_seen
-            
-            # Higher confidence for recent listings (within last 30 days)
-            if time_diff <= timedelta(days=7):
-                return 1.0
-            elif time_diff <= timedelta(days=30):
-                return 0.8
-            elif time_diff <= timedelta(days=90):
-                return 0.6
-            else:
-                return 0.3
-                
+            return datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
+        except (AttributeError, ValueError):
+            return None
+    
+    def _calculate_time_factor(self, last_seen, now):
+        """Calculate time-based confidence factor from a parsed last_seen"""
+        try:
+            return self._time_factor_from_days((now - last_seen).days)
         except:
             return 0.5
     
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def _time_factor_from_days(days_ago):
+        """Bucket whole days since last seen into a confidence factor"""
+        # Higher confidence for recent listings (within last 30 days)
+        if days_ago < 7:
+            return 1.0
+        elif days_ago < 30:
+            return 0.8
+        elif days_ago < 90:
+            return 0.6
+        else:
+            return 0.3
+    
     def _detect_changes(self, new_listing, stored_listing):
         """Detect what changed between listings"""
         changes = {
@@ -291,7 +401,7 @@ class AdvancedDuplicateManager:
         new_desc = new_listing.get('description', '')
         
         if old_desc and new_desc:
-            similarity = difflib.SequenceMatcher(None, old_desc, new_desc).ratio()
+            similarity = fuzz.ratio(old_desc, new_desc) / 100.0
             if similarity < 0.9:  # Less than 90% similar
                 changes['content_changed'] = True
         
@@ -308,11 +418,13 @@ class AdvancedDuplicateManager:
     
     def add_to_duplicate_db(self, listing_data, fingerprints):
         """Add new listing to duplicate database"""
-        db = self._load_duplicate_db()
-        
-        listing_id = listing_data.get('id') or str(datetime.now().timestamp())
+        return self._store_new_listing(listing_data, fingerprints, datetime.now())
+    
+    def _store_new_listing(self, listing_data, fingerprints, now):
+        """Insert a listing row"""
+        listing_id = listing_data.get('id') or str(now.timestamp())
         
-        db[listing_id] = {
+        self._insert_entry({
             'listing_id': listing_id,
             'original_url': listing_data.get('url'),
             'title': listing_data.get('title'),
@@ -322,86 +434,232 @@ class AdvancedDuplicateManager:
             'seller': listing_data.get('seller'),
             'location': listing_data.get('location'),
             'fingerprints': fingerprints,
-            'first_seen': datetime.now().isoformat(),
-            'last_seen': datetime.now().isoformat(),
+            'fingerprint_algo': FINGERPRINT_ALGO,
+            'first_seen': now.isoformat(),
+            'last_seen': now.isoformat(),
             'times_seen': 1
-        }
-        
-        self._save_duplicate_db(db)
+        })
         return listing_id
     
     def update_duplicate_entry(self, listing_id, new_data, changes):
         """Update existing duplicate entry with changes"""
-        db = self._load_duplicate_db()
-        
-        if listing_id in db:
-            entry = db[listing_id]
-            
-            # Update changed fields
-            if changes['price_changed']:
-                self._record_price_change(listing_id, entry['price'], new_data.get('price'))
-                entry['price'] = new_data.get('price')
-            
-            if changes['content_changed']:
-                entry['description'] = new_data.get('description')
-            
-            if changes['images_changed']:
-                entry['images'] = new_data.get('images', [])
-            
-            # Update metadata
-            entry['last_seen'] = datetime.now().isoformat()
-            entry['times_seen'] += 1
-            
-            db[listing_id] = entry
-            self._save_duplicate_db(db)
+        entry = self._get_entry(listing_id)
+        
+        if entry:
+            with self._transaction():
+                # Update changed fields
+                if changes['price_changed']:
+                    self._record_price_change(listing_id, entry['price'], new_data.get('price'))
+                    entry['price'] = new_data.get('price')
+                
+                if changes['content_changed']:
+                    entry['description'] = new_data.get('description')
+                
+                if changes['images_changed']:
+                    entry['images'] = new_data.get('images', [])
+                
+                # Update metadata
+                self.conn.execute('''
+                    UPDATE listings SET
+                        price = ?, description = ?, images = ?,
+                        last_seen = ?, times_seen = times_seen + 1
+                    WHERE listing_id = ?
+                ''', (entry['price'], entry['description'], json.dumps(entry['images']),
+                      datetime.now().isoformat(), listing_id))
     
     def _record_price_change(self, listing_id, old_price, new_price):
         """Record price change in history database"""
-        history_db = self._load_price_history_db()
-        
-        if listing_id not in history_db:
-            history_db[listing_id] = []
-        
-        history_db[listing_id].append({
-            'timestamp': datetime.now().isoformat(),
-            'old_price': old_price,
-            'new_price': new_price,
-            'change_amount': new_price - old_price if (old_price and new_price) else None,
-            'change_type': 'increase' if (old_price and new_price and new_price > old_price) else 'decrease'
-        })
-        
-        self._save_price_history_db(history_db)
+        self.conn.execute('''
+            INSERT INTO price_history
+            (listing_id, timestamp, old_price, new_price, change_amount, change_type)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (listing_id, datetime.now().isoformat(), old_price, new_price,
+              new_price - old_price if (old_price and new_price) else None,
+              'increase' if (old_price and new_price and new_price > old_price) else 'decrease'))
     
     def get_price_history(self, listing_id):
         """Get complete price history for a listing"""
-        history_db = self._load_price_history_db()
-        return history_db.get(listing_id, [])
+        rows = self.conn.execute('''
+            SELECT timestamp, old_price, new_price, change_amount, change_type
+            FROM price_history WHERE listing_id = ? ORDER BY id
+        ''', (listing_id,)).fetchall()
+        return [dict(row) for row in rows]
     
-    def _load_duplicate_db(self):
-        """Load duplicate database"""
-        try:
-            with open(self.duplicate_db, 'r') as f:
-                return json.load(f)
-        except FileNotFoundError:
+    def _create_schema(self):
+        """Create the listings and price history tables"""
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS listings (
+                listing_id TEXT PRIMARY KEY,
+                url TEXT,
+                title TEXT,
+                price NUMERIC,
+                description TEXT,
+                images TEXT,
+                seller TEXT,
+                location TEXT,
+                fp_exact TEXT,
+                fp_content TEXT,
+                fp_item TEXT,
+                fp_images TEXT,
+                fp_seller_item TEXT,
+                fingerprint_algo TEXT,
+                first_seen TEXT,
+                last_seen TEXT,
+                times_seen INTEGER
+            )
+        ''')
+        
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS price_history (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                listing_id TEXT,
+                timestamp TEXT,
+                old_price NUMERIC,
+                new_price NUMERIC,
+                change_amount NUMERIC,
+                change_type TEXT,
+                FOREIGN KEY (listing_id) REFERENCES listings (listing_id)
+            )
+        ''')
+        
+        # Every duplicate probe is an indexed equality lookup
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_listings_url ON listings (url)")
+        for column in FP_COLUMNS.values():
+            self.conn.execute(f"CREATE INDEX IF NOT EXISTS idx_listings_{column} ON listings ({column})")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_price_history_listing ON price_history (listing_id)")
+    
+    def _insert_entry(self, entry):
+        """Insert or replace a listing row from an entry dict"""
+        fingerprints = entry.get('fingerprints') or {}
+        self.conn.execute('''
+            INSERT OR REPLACE INTO listings
+            (listing_id, url, title, price, description, images, seller, location,
+             fp_exact, fp_content, fp_item, fp_images, fp_seller_item,
+             fingerprint_algo, first_seen, last_seen, times_seen)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (entry['listing_id'], entry.get('original_url'), entry.get('title'), entry.get('price'),
+              entry.get('description'), json.dumps(entry.get('images') or []), entry.get('seller'),
+              entry.get('location'),
+              *(fingerprints.get(fp_type) for fp_type in FP_COLUMNS),
+              entry.get('fingerprint_algo'), entry.get('first_seen'), entry.get('last_seen'),
+              entry.get('times_seen', 1)))
+    
+    def _get_entry(self, listing_id):
+        """Fetch one stored listing as an entry dict"""
+        row = self.conn.execute("SELECT * FROM listings WHERE listing_id = ?", (listing_id,)).fetchone()
+        return self._row_to_entry(row) if row else None
+    
+    def _row_to_entry(self, row):
+        """Convert a listings row to the entry dict used by the matchers"""
+        return {
+            'listing_id': row['listing_id'],
+            'original_url': row['url'],
+            'title': row['title'],
+            'price': row['price'],
+            'description': row['description'],
+            'images': json.loads(row['images']) if row['images'] else [],
+            'seller': row['seller'],
+            'location': row['location'],
+            'fingerprints': {fp_type: row[column] for fp_type, column in FP_COLUMNS.items()},
+            'fingerprint_algo': row['fingerprint_algo'],
+            'first_seen': row['first_seen'],
+            'last_seen': row['last_seen'],
+            'times_seen': row['times_seen']
+        }
+    
+    def _refresh_stale_fingerprints(self):
+        """Recompute fingerprints stored with a different hash algorithm"""
+        rows = self.conn.execute(
+            "SELECT * FROM listings WHERE fingerprint_algo IS NULL OR fingerprint_algo != ?",
+            (FINGERPRINT_ALGO,)
+        ).fetchall()
+        if not rows:
+            return
+        
+        with self._transaction():
+            for row in rows:
+                entry = self._row_to_entry(row)
+                entry['fingerprints'] = self.create_composite_fingerprint({
+                    'title': entry['title'] or '',
+                    'description': entry['description'] or '',
+                    'price': entry['price'],
+                    'location': entry['location'] or '',
+                    'images': entry['images'],
+                    'seller': entry['seller'] or ''
+                })
+                entry['fingerprint_algo'] = FINGERPRINT_ALGO
+                self._insert_entry(entry)
+        
+        logger.info(f"Re-fingerprinted {len(rows)} stored listings with {FINGERPRINT_ALGO}")
+    
+    def _import_legacy_json(self):
+        """One-time import of the JSON (+ JSONL change log) stores into an empty database"""
+        if self.conn.execute("SELECT 1 FROM listings LIMIT 1").fetchone():
+            return
+        
+        entries = self._read_legacy_store(self.legacy_duplicate_db)
+        for entry in self._read_legacy_log(f"{self.legacy_duplicate_db}l"):
+            entries[entry['listing_id']] = entry
+        
+        history = self._read_legacy_store(self.legacy_price_history_db)
+        for record in self._read_legacy_log(f"{self.legacy_price_history_db}l"):
+            history.setdefault(record['listing_id'], []).append(record['change'])
+        
+        if not entries and not history:
+            return
+        
+        with self._transaction():
+            for entry in entries.values():
+                self._insert_entry(entry)
+            for listing_id, changes in history.items():
+                for change in changes:
+                    self.conn.execute('''
+                        INSERT INTO price_history
+                        (listing_id, timestamp, old_price, new_price, change_amount, change_type)
+                        VALUES (?, ?, ?, ?, ?, ?)
+                    ''', (listing_id, change.get('timestamp'), change.get('old_price'),
+                          change.get('new_price'), change.get('change_amount'), change.get('change_type')))
+        
+        logger.info(f"Imported {len(entries)} listings from {self.legacy_duplicate_db} into {self.db_path}")
+    
+    def _read_legacy_store(self, path):
+        """Read a JSON snapshot, empty if missing"""
+        if not os.path.exists(path):
             return {}
+        with open(path, 'rb') as f:
+            return json_io.loads(f.read())
     
-    def _save_duplicate_db(self, db):
-        """Save duplicate database"""
-        with open(self.duplicate_db, 'w') as f:
-            json.dump(db, f, indent=2)
+    def _read_legacy_log(self, path):
+        """Read a JSONL change log, empty if missing"""
+        if not os.path.exists(path):
+            return []
+        with open(path, 'rb') as f:
+            return [json_io.loads(line) for line in f if line.strip()]
     
-    def _load_price_history_db(self):
-        """Load price history database"""
+    @contextmanager
+    def _transaction(self):
+        """Group writes into one transaction (no-op if one is already open)"""
+        if self.conn.in_transaction:
+            yield
+            return
+        
+        self.conn.execute('BEGIN')
         try:
-            with open(self.price_history_db, 'r') as f:
-                return json.load(f)
-        except FileNotFoundError:
-            return {}
+            yield
+        except Exception:
+            self.conn.execute('ROLLBACK')
+            raise
+        self.conn.execute('COMMIT')
+    
+    def close(self):
+        """Close the database connection"""
+        self.conn.close()
+    
+    def __enter__(self):
+        return self
     
-    def _save_price_history_db(self, db):
-        """Save price history database"""
-        with open(self.price_history_db, 'w') as f:
-            json.dump(db, f, indent=2)
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
 # Usage example
 if __name__ == "__main__":
@@ -3,9 +3,48 @@
 Direct Analysis of Complete 181 Listings Dataset
 """
 
-import json
 import os
+import re
 from datetime import datetime
+import numpy as np
+import pandas as pd
+import json_io
+
+# Checked in order, first hit wins
+MAKE_LABELS = ['Yamaha', 'Sea-Doo', 'Kawasaki', 'Polaris', 'Honda']
+MAKE_PATTERNS = ['yamaha', 'sea-?doo', 'kawasaki', 'polaris', 'honda']
+
+YEAR_RE = re.compile(r'(20\d{2}|19\d{2})')
+
+PRICE_BUCKETS = ['under_5k', '5k_10k', '10k_15k', '15k_20k', 'over_20k']
+
+def tally_with_pandas(listings):
+    """Vectorized make/year/price tallies over the whole dataset"""
+    df = pd.DataFrame({
+        'title': [listing.get('title', '') for listing in listings],
+        'price': [listing.get('price') for listing in listings]
+    })
+    titles = df['title'].fillna('').astype(str).str.lower()
+    
+    make = np.select([titles.str.contains(p) for p in MAKE_PATTERNS], MAKE_LABELS, default='Unknown')
+    makes = {k: int(v) for k, v in pd.Series(make).value_counts().items()}
+    
+    year_counts = titles.str.extract(YEAR_RE, expand=False).dropna().value_counts()
+    years = {k: int(v) for k, v in year_counts.items()}
+    
+    # Only non-zero int/float prices count, anything else is "no price"
+    price = df['price']
+    has_price = price.map(type).isin((int, float)) & price.notna() & price.astype(bool)
+    buckets = pd.cut(
+        price[has_price].astype(float),
+        [-np.inf, 5000, 10000, 15000, 20000, np.inf],
+        right=False,
+        labels=PRICE_BUCKETS
+    ).value_counts()
+    price_ranges = {bucket: int(buckets[bucket]) for bucket in PRICE_BUCKETS}
+    price_ranges['no_price'] = len(df) - int(has_price.sum())
+    
+    return makes, years, price_ranges
 
 def analyze_complete_dataset():
     """Analyze the complete 181 listing dataset"""
@@ -16,66 +55,16 @@ def analyze_complete_dataset():
     filename = "complete_csv_import_20250828_222849.json"
     
     try:
-        with open(filename, 'r') as f:
-            data = json.load(f)
+        with open(filename, 'rb') as f:
+            raw = f.read()
+        data = json_io.loads(raw)
         
         listings = data['data'] if 'data' in data else data
         
         print(f"📊 Total listings found: {len(listings)}")
         
-        # Analyze by make
-        makes = {}
-        years = {}
-        price_ranges = {
-            'under_5k': 0,
-            '5k_10k': 0, 
-            '10k_15k': 0,
-            '15k_20k': 0,
-            'over_20k': 0,
-            'no_price': 0
-        }
-        
-        for listing in listings:
-            # Extract make from title
-            title = listing.get('title', '').lower()
-            
-            if 'yamaha' in title:
-                make = 'Yamaha'
-            elif 'sea-doo' in title or 'seadoo' in title:
-                make = 'Sea-Doo'
-            elif 'kawasaki' in title:
-                make = 'Kawasaki'
-            elif 'polaris' in title:
-                make = 'Polaris'
-            elif 'honda' in title:
-                make = 'Honda'
-            else:
-                make = 'Unknown'
-            
-            makes[make] = makes.get(make, 0) + 1
-            
-            # Extract year (look for 4-digit number 20xx or 19xx)
-            import re
-            year_match = re.search(r'(20\d{2}|19\d{2})', title)
-            if year_match:
-                year = year_match.group(1)
-                years[year] = years.get(year, 0) + 1
-            
-            # Analyze price if available
-            price = listing.get('price')
-            if price and isinstance(price, (int, float)):
-                if price < 5000:
-                    price_ranges['under_5k'] += 1
-                elif price < 10000:
-                    price_ranges['5k_10k'] += 1
-                elif price < 15000:
-                    price_ranges['10k_15k'] += 1
-                elif price < 20000:
-                    price_ranges['15k_20k'] += 1
-                else:
-                    price_ranges['over_20k'] += 1
-            else:
-                price_ranges['no_price'] += 1
+        # Analyze by make, year and price range
+        makes, years, price_ranges = tally_with_pandas(listings)
         
         # Create analysis report
         analysis = {
@@ -89,8 +78,9 @@ def analyze_complete_dataset():
         
         # Save analysis
         output_file = f"complete_181_analysis_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-        with open(output_file, 'w') as f:
-            json.dump(analysis, f, indent=2)
+        report = json_io.dumps(analysis, indent=True)
+        with open(output_file, 'wb') as f:
+            f.write(report)
         
         # Print summary
         print("\n📊 ANALYSIS RESULTS:")
@@ -6,48 +6,168 @@ Handles "See more" buttons and extracts full listing details
 
 import json
 import asyncio
+import hashlib
 import os
+import time
 from datetime import datetime
 from playwright.async_api import async_playwright
 import logging
 import re
+import sqlite3
+import aiofiles
+from rate_limiter import RateLimiter
+import json_io
 
 logger = logging.getLogger(__name__)
 
+# Same stealth settings as FixedMarketplaceEnhancer
+CONTEXT_OPTIONS = {
+    'viewport': {'width': 1366, 'height': 768},
+    'user_agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36',
+    'locale': 'en-US',
+    'timezone_id': 'America/New_York',
+    'service_workers': 'block'
+}
+
+# Top of the listing only; full_page with a clip caps how far a long page is rasterized
+SCREENSHOT_CLIP = {'x': 0, 'y': 0, 'width': 1366, 'height': 2000}
+SCREENSHOT_MODES = ('fallback', 'always', 'never')
+
+# Not needed for extraction; images and stylesheets stay so screenshots and innerText render
+BLOCKED_RESOURCE_TYPES = {'font', 'media', 'other'}
+
+# Common "See more" button selectors
+SEE_MORE_SEL = ', '.join([
+    '[aria-label="See more"]',
+    '[data-testid="see-more-button"]',
+    '.see-more-button',
+    'button[aria-expanded="false"]'
+])
+
+# Clicks every match in-page; button:has-text("See more") becomes an innerText check
+EXPAND_JS = """
+(selector) => {
+    const buttons = new Set(document.querySelectorAll(selector));
+    for (const button of document.getElementsByTagName('button')) {
+        if (button.innerText.includes('See more')) buttons.add(button);
+    }
+    let clicked = 0;
+    buttons.forEach(button => {
+        try {
+            button.click();
+            clicked++;
+        } catch (e) {
+            // Detached by an earlier click
+        }
+    });
+    return clicked;
+}
+"""
+
+# Reads every field in one round-trip; selectors are tried in priority order in-page.
+# :has-text() is Playwright-only, so those lookups filter on innerText instead.
+EXTRACT_JS = """
+() => {
+    const text = (el) => el ? el.innerText : null;
+    const first = (...selectors) => {
+        for (const s of selectors) {
+            const el = document.querySelector(s);
+            if (el) return el.innerText;
+        }
+        return null;
+    };
+    const containing = (selector, needle) =>
+        text([...document.querySelectorAll(selector)].find(el => el.innerText.includes(needle)));
+    // Live collection, stops at the limit instead of collecting every <img>
+    const listingImages = (limit) => {
+        const images = [];
+        const imgs = document.getElementsByTagName('img');
+        for (let i = 0; i < imgs.length && images.length < limit; i++) {
+            const src = imgs[i].getAttribute('src');
+            if (src && (src.includes('scontent') || src.includes('fbcdn'))) images.push(src);
+        }
+        return images;
+    };
+    return {
+        prices: [
+            text(document.querySelector('[data-testid="marketplace-product-price"]')),
+            text(document.querySelector('.marketplace-price')),
+            text(document.querySelector('[aria-label*="price"]')),
+            containing('span', '$')
+        ].filter(Boolean),
+        title: first('h1', '[data-testid="marketplace-product-title"]', '.marketplace-title'),
+        description: first('[data-testid="marketplace-product-description"]', '.marketplace-description')
+            || containing('[role="article"] div', 'Details'),
+        location: first('[data-testid="marketplace-product-location"]', '.marketplace-location')
+            || containing('span', 'miles away'),
+        seller: first('[data-testid="marketplace-product-seller"]', '.marketplace-seller'),
+        images: listingImages(10)
+    };
+}
+"""
+
+PRICE_RE = re.compile(r'\$[\d,]+')
+_FILENAME_RE = re.compile(r'[^\w\s-]+')
+
+CACHE_TTL = 86400  # Seconds a cached extraction is reused before the listing is fetched again
+
 class EnhancedScreenshotCollector:
-    def __init__(self, input_file, output_dir="screenshots"):
+    def __init__(self, input_file, output_dir="screenshots", batch_size=10, rotate_after=50,
+                 screenshot_mode='fallback', cache_file="extraction_cache.db"):
         self.input_file = input_file
         self.output_dir = output_dir
         self.screenshot_count = 0
         self.failed_count = 0
-        self.extracted_data = []
+        self.price_count = 0
+        
+        # Run stamp shared by output names; the sequence keeps screenshot names unique
+        self.start_ts = datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.screenshot_seq = 0
+        
+        # Each extraction is written here as it completes, not held in memory
+        self.db_file = None
+        self.db = None
+        self.commit_every = 10
+        
+        # Complete extractions kept across runs, so reruns skip listings fetched recently
+        self.cache_file = cache_file
+        self.cache = None
+        
+        # Pages kept open in the shared context; bounds concurrent listings
+        self.batch_size = batch_size
+        self.page_pool = None
+        self.browser = None
+        self.context = None
+        
+        # 'fallback' only screenshots listings whose price or title wasn't extracted
+        if screenshot_mode not in SCREENSHOT_MODES:
+            raise ValueError(f"screenshot_mode must be one of {SCREENSHOT_MODES}")
+        self.screenshot_mode = screenshot_mode
+        
+        # Listings per context before it is replaced, keeping cookies and memory bounded
+        self.rotate_after = rotate_after
+        self.context_uses = 0
+        self.rotate_lock = asyncio.Lock()
+        
+        # Replaced contexts and how many of their pages are still in the pool or in use
+        self.retired_pages = {}
+        
+        # Paces navigations across all pages instead of pausing between batches
+        self.rate_limiter = RateLimiter(rate=0.5, burst=batch_size)
         
         os.makedirs(output_dir, exist_ok=True)
         
     async def expand_details(self, page):
         """Expand all 'See more' buttons and details"""
         try:
-            # Common "See more" button selectors
-            see_more_selectors = [
-                '[aria-label="See more"]',
-                'button:has-text("See more")',
-                '[data-testid="see-more-button"]',
-                '.see-more-button',
-                'button[aria-expanded="false"]'
-            ]
+            # Click every "See more" button in one round-trip
+            await page.evaluate(EXPAND_JS, SEE_MORE_SEL)
             
-            # Try to click all "See more" buttons
-            for selector in see_more_selectors:
-                buttons = await page.query_selector_all(selector)
-                for button in buttons:
-                    try:
-                        await button.click()
-                        await page.wait_for_timeout(500)  # Brief wait for expansion
-                    except:
-                        continue
-            
-            # Wait for content to fully load
-            await page.wait_for_timeout(1000)
+            # Wait for any content the clicks requested, not a fixed delay
+            try:
+                await page.wait_for_load_state('networkidle', timeout=2000)
+            except Exception:
+                pass
             
         except Exception as e:
             logger.debug(f"Detail expansion failed: {e}")
@@ -57,82 +177,20 @@ class EnhancedScreenshotCollector:
         data = {"url": url}
         
         try:
-            # Extract price
-            price_selectors = [
-                '[data-testid="marketplace-product-price"]',
-                '.marketplace-price',
-                '[aria-label*="price"]',
-                'span:has-text("$")'
-            ]
-            
-            for selector in price_selectors:
-                price_elem = await page.query_selector(selector)
-                if price_elem:
-                    price_text = await price_elem.inner_text()
-                    price_match = re.search(r'\$[\d,]+', price_text)
-                    if price_match:
-                        data['price'] = price_match.group().replace('$', '').replace(',', '')
-                        break
+            raw = await page.evaluate(EXTRACT_JS)
             
-            # Extract title
-            title_selectors = [
-                'h1',
-                '[data-testid="marketplace-product-title"]',
-                '.marketplace-title'
-            ]
-            
-            for selector in title_selectors:
-                title_elem = await page.query_selector(selector)
-                if title_elem:
-                    data['title'] = await title_elem.inner_text()
+            # Keep the first price candidate that holds a dollar amount
+            for price_text in raw['prices']:
+                price_match = PRICE_RE.search(price_text)
+                if price_match:
+                    data['price'] = price_match.group().replace('$', '').replace(',', '')
                     break
             
-            # Extract description/details
-            desc_selectors = [
-                '[data-testid="marketplace-product-description"]',
-                '.marketplace-description',
-                '[role="article"] div:has-text("Details")'
-            ]
-            
-            for selector in desc_selectors:
-                desc_elem = await page.query_selector(selector)
-                if desc_elem:
-                    data['description'] = await desc_elem.inner_text()
-                    break
-            
-            # Extract location
-            location_selectors = [
-                '[data-testid="marketplace-product-location"]',
-                '.marketplace-location',
-                'span:has-text("miles away")'
-            ]
-            
-            for selector in location_selectors:
-                loc_elem = await page.query_selector(selector)
-                if loc_elem:
-                    data['location'] = await loc_elem.inner_text()
-                    break
+            for field in ('title', 'description', 'location', 'seller'):
+                if raw[field] is not None:
+                    data[field] = raw[field]
             
-            # Extract seller info
-            seller_selectors = [
-                '[data-testid="marketplace-product-seller"]',
-                '.marketplace-seller'
-            ]
-            
-            for selector in seller_selectors:
-                seller_elem = await page.query_selector(selector)
-                if seller_elem:
-                    data['seller'] = await seller_elem.inner_text()
-                    break
-            
-            # Extract images (URLs)
-            img_elements = await page.query_selector_all('img')
-            images = []
-            for img in img_elements:
-                src = await img.get_attribute('src')
-                if src and ('scontent' in src or 'fbcdn' in src):
-                    images.append(src)
-            data['images'] = images[:10]  # Limit to first 10 images
+            data['images'] = raw['images']  # Limited to first 10 images in-page
             
             return data
             
@@ -140,7 +198,7 @@ class EnhancedScreenshotCollector:
             logger.error(f"Data extraction failed for {url}: {e}")
             return data
     
-    async def screenshot_and_extract(self, browser, listing):
+    async def screenshot_and_extract(self, listing):
         """Enhanced screenshot with data extraction"""
         url = listing.get('url', '')
         title = listing.get('title', 'Unknown')
@@ -149,9 +207,17 @@ class EnhancedScreenshotCollector:
         if not url:
             logger.warning(f"No URL for listing: {title}")
             return None
-            
+        
+        cached = self.cached_extraction(url)
+        if cached is not None:
+            cached['listing_id'] = listing_id
+            self.record_extraction(cached)
+            logger.info(f"♻️ Cached capture: {title} - Price: ${cached.get('price', 'N/A')}")
+            return cached
+        
+        page = await self._acquire_page()
         try:
-            page = await browser.new_page()
+            await self.rate_limiter.acquire()
             
             # Navigate to listing
             await page.goto(url, wait_until='networkidle', timeout=30000)
@@ -162,33 +228,136 @@ class EnhancedScreenshotCollector:
             # Extract data
             extracted_data = await self.extract_listing_data(page, url)
             
-            # Take screenshot
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            clean_title = re.sub(r'[^\w\s-]', '', title)[:50]
-            filename = f"{listing_id}_{clean_title}_{timestamp}.png"
-            filepath = os.path.join(self.output_dir, filename)
             
-            await page.screenshot(path=filepath, full_page=True)
+            # Take screenshot
+            filename = None
+            if self.needs_screenshot(extracted_data):
+                self.screenshot_seq += 1
+                clean_title = _FILENAME_RE.sub('', title)[:50]
+                filename = f"{listing_id}_{clean_title}_{self.start_ts}_{self.screenshot_seq}.jpg"
+                
+                image = await page.screenshot(type='jpeg', quality=70, full_page=True, clip=SCREENSHOT_CLIP)
+                async with aiofiles.open(os.path.join(self.output_dir, filename), 'wb') as f:
+                    await f.write(image)
             
             # Add screenshot path to extracted data
             extracted_data['screenshot'] = filename
             extracted_data['listing_id'] = listing_id
             extracted_data['extraction_timestamp'] = timestamp
             
-            self.extracted_data.append(extracted_data)
-            self.screenshot_count += 1
+            self.record_extraction(extracted_data)
+            if self.is_complete(extracted_data):
+                self.cache_extraction(url, extracted_data)
             
             logger.info(f"✅ Enhanced capture: {title} - Price: ${extracted_data.get('price', 'N/A')}")
             
-            await page.close()
             return extracted_data
             
         except Exception as e:
             logger.error(f"❌ Failed to capture {title}: {e}")
             self.failed_count += 1
-            if 'page' in locals():
-                await page.close()
             return None
+        
+        finally:
+            await self._release_page(page)
+    
+    @staticmethod
+    def is_complete(extracted_data):
+        """Whether extraction found both the price and the title"""
+        return extracted_data.get('price') is not None and extracted_data.get('title') is not None
+    
+    def needs_screenshot(self, extracted_data):
+        """Whether to keep a screenshot of this listing under the screenshot mode"""
+        if self.screenshot_mode == 'fallback':
+            return not self.is_complete(extracted_data)
+        return self.screenshot_mode == 'always'
+    
+    def record_extraction(self, extracted_data):
+        """Store a finished extraction for this run and count it"""
+        self.save_extraction(extracted_data)
+        self.screenshot_count += 1
+        if extracted_data.get('price'):
+            self.price_count += 1
+    
+    async def _open_context(self, browser):
+        """Fresh stealth context shared by the pooled pages"""
+        context = await browser.new_context(**CONTEXT_OPTIONS)
+        await context.route('**/*', self._route_request)
+        return context
+    
+    async def _fill_page_pool(self, browser):
+        """Open the shared context and its pool of pages"""
+        self.browser = browser
+        self.context = await self._open_context(browser)
+        self.context_uses = 0
+        
+        self.page_pool = asyncio.Queue()
+        for _ in range(self.batch_size):
+            self.page_pool.put_nowait(await self.context.new_page())
+    
+    async def _route_request(self, route):
+        """Abort requests for resource types extraction doesn't need"""
+        if route.request.resource_type in BLOCKED_RESOURCE_TYPES:
+            await route.abort()
+        else:
+            await route.continue_()
+    
+    async def _acquire_page(self):
+        """Take a page from the pool, swapping out pages left over from a replaced context"""
+        page = await self.page_pool.get()
+        
+        old_context = page.context
+        if old_context is self.context:
+            return page
+        
+        try:
+            fresh = await self.context.new_page()
+        except Exception as e:
+            # Keep the old page rather than shrinking the pool; swapped on its next use
+            logger.warning(f"⚠️ Could not open page in new context: {e}")
+            return page
+        
+        self.retired_pages[old_context] -= 1
+        if self.retired_pages[old_context] == 0:
+            del self.retired_pages[old_context]
+            try:
+                await old_context.close()
+            except Exception as e:
+                logger.warning(f"⚠️ Could not close browser context: {e}")
+        
+        return fresh
+    
+    async def _release_page(self, page):
+        """Reset a page and return it to the pool, rotating the context once it has been used enough"""
+        try:
+            await page.goto("about:blank")
+        except Exception as e:
+            logger.debug(f"Page reset failed: {e}")
+        
+        if page.context is self.context:
+            self.context_uses += 1
+            if self.context_uses >= self.rotate_after:
+                await self._rotate_context()
+        
+        self.page_pool.put_nowait(page)
+    
+    async def _rotate_context(self):
+        """Replace the shared context; its pages move over as they are next acquired"""
+        async with self.rotate_lock:
+            if self.context_uses < self.rotate_after:
+                return  # Another release already rotated
+            
+            try:
+                fresh = await self._open_context(self.browser)
+            except Exception as e:
+                # Keep the old context; retried on the next release
+                logger.warning(f"⚠️ Could not rotate browser context: {e}")
+                return
+            
+            self.retired_pages[self.context] = self.batch_size
+            self.context = fresh
+            self.context_uses = 0
     
     async def collect_enhanced_screenshots(self):
         """Main collection process with enhanced data extraction"""
@@ -205,48 +374,136 @@ class EnhancedScreenshotCollector:
         
         logger.info(f"📋 Found {len(listings)} listings to process")
         
+        output_file = f"enhanced_extraction_{self.start_ts}.json"
+        self.open_db(f"enhanced_{self.start_ts}.db")
+        self.open_cache()
+        
         async with async_playwright() as p:
             browser = await p.chromium.launch(headless=True)
             
             try:
-                # Process in batches of 3 for enhanced extraction
-                batch_size = 3
-                for i in range(0, len(listings), batch_size):
-                    batch = listings[i:i + batch_size]
-                    batch_num = (i // batch_size) + 1
-                    total_batches = (len(listings) + batch_size - 1) // batch_size
-                    
-                    logger.info(f"📦 Processing enhanced batch {batch_num}/{total_batches}")
-                    
-                    # Process batch with data extraction
-                    tasks = [self.screenshot_and_extract(browser, listing) for listing in batch]
-                    await asyncio.gather(*tasks, return_exceptions=True)
-                    
-                    # Wait between batches
-                    if i + batch_size < len(listings):
-                        logger.info("⏳ Waiting between enhanced batches...")
-                        await asyncio.sleep(8)  # Longer wait for detailed extraction
+                await self._fill_page_pool(browser)
+                logger.info(f"📦 Processing with {self.batch_size} pooled pages")
+                
+                # Pages pick up the next listing as soon as they are free
+                tasks = [self.screenshot_and_extract(listing) for listing in listings]
+                await asyncio.gather(*tasks, return_exceptions=True)
                         
             finally:
                 await browser.close()
+                self.db.commit()
         
         # Save extracted data
-        output_file = f"enhanced_extraction_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-        with open(output_file, 'w') as f:
-            json.dump({
-                'extraction_timestamp': datetime.now().isoformat(),
-                'total_processed': len(self.extracted_data),
-                'data': self.extracted_data
-            }, f, indent=2)
+        self.write_summary(output_file)
+        self.db.close()
+        self.cache.close()
         
         logger.info(f"""
 🎯 Enhanced Collection Complete!
 ✅ Successful: {self.screenshot_count}
 ❌ Failed: {self.failed_count}
 📁 Screenshots: {self.output_dir}/
-📊 Enhanced data: {output_file}
-💰 Prices extracted: {len([d for d in self.extracted_data if d.get('price')])}
+📊 Enhanced data: {output_file} ({self.db_file})
+💰 Prices extracted: {self.price_count}
         """)
+    
+    def open_db(self, db_file):
+        """Create the per-run SQLite store extractions are written to as they finish"""
+        self.db_file = db_file
+        self.db = sqlite3.connect(db_file)
+        
+        # WAL lets analysis read while collection is still writing
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute('''
+            CREATE TABLE IF NOT EXISTS listings (
+                id INTEGER PRIMARY KEY,
+                listing_id TEXT,
+                url TEXT,
+                title TEXT,
+                price REAL,
+                description TEXT,
+                location TEXT,
+                seller TEXT,
+                images JSON,
+                screenshot TEXT,
+                ts TEXT
+            )
+        ''')
+        self.db.commit()
+    
+    def save_extraction(self, data):
+        """Insert one extraction, committing every commit_every rows"""
+        self.db.execute(
+            '''INSERT INTO listings
+               (listing_id, url, title, price, description, location, seller, images, screenshot, ts)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+            (
+                data.get('listing_id'), data.get('url'), data.get('title'), data.get('price'),
+                data.get('description'), data.get('location'), data.get('seller'),
+                json_io.dumps(data.get('images', [])).decode(), data.get('screenshot'),
+                data.get('extraction_timestamp')
+            )
+        )
+        if (self.screenshot_count + 1) % self.commit_every == 0:
+            self.db.commit()
+    
+    def open_cache(self):
+        """Open the cross-run extraction cache, keyed by a hash of the listing URL"""
+        self.cache = sqlite3.connect(self.cache_file, isolation_level=None)
+        self.cache.execute('PRAGMA journal_mode=WAL')
+        self.cache.execute('''
+            CREATE TABLE IF NOT EXISTS cache (
+                url_hash TEXT PRIMARY KEY,
+                ts INTEGER,
+                data BLOB
+            )
+        ''')
+    
+    @staticmethod
+    def _url_hash(url):
+        return hashlib.blake2b(url.encode(), digest_size=8).hexdigest()
+    
+    def cached_extraction(self, url):
+        """Extraction stored for this URL within CACHE_TTL, or None"""
+        row = self.cache.execute(
+            'SELECT data FROM cache WHERE url_hash = ? AND ts > ?',
+            (self._url_hash(url), int(time.time()) - CACHE_TTL)
+        ).fetchone()
+        return json_io.loads(row[0]) if row else None
+    
+    def cache_extraction(self, url, extracted_data):
+        """Remember a complete extraction for later runs"""
+        self.cache.execute(
+            'INSERT OR REPLACE INTO cache (url_hash, ts, data) VALUES (?, ?, ?)',
+            (self._url_hash(url), int(time.time()), json_io.dumps(extracted_data))
+        )
+    
+    def write_summary(self, output_file):
+        """Write the summary JSON from the database, one record at a time"""
+        header = json_io.dumps({
+            'extraction_timestamp': datetime.now().isoformat(),
+            'total_processed': self.screenshot_count
+        })
+        rows = self.db.execute(
+            '''SELECT url, price, title, description, location, seller, images, screenshot, listing_id, ts
+               FROM listings ORDER BY id'''
+        )
+        with open(output_file, 'wb') as out:
+            out.write(header[:-1] + b',"data":[')
+            for i, row in enumerate(rows):
+                url, price, title, description, location, seller, images, screenshot, listing_id, ts = row
+                record = {'url': url}
+                for key, value in (('price', price), ('title', title), ('description', description),
+                                   ('location', location), ('seller', seller)):
+                    if value is not None:
+                        record[key] = value
+                record['images'] = json.loads(images)
+                record['screenshot'] = screenshot
+                record['listing_id'] = listing_id
+                record['extraction_timestamp'] = ts
+                out.write((b',\n' if i else b'\n') + json_io.dumps(record))
+            out.write(b'\n]}\n')
 
 async def main():
     """Main entry point for enhanced collector"""
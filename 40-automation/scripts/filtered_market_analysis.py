@@ -6,9 +6,71 @@ Properly categorizes and filters sold vs active listings
 
 import json
 import re
-from collections import defaultdict, Counter
+from collections import Counter
 import statistics
 from datetime import datetime
+from listing_parse import MAKE_NORM, MAKE_RE
+import json_io
+import pandas as pd
+
+MIN_LISTINGS_PER_MAKE = 3
+DEAL_Z_SCORE = -1.5  # Significantly below the make average
+
+def listing_price(listing):
+    """Listing price as a float, 0 when missing"""
+    price = listing.get('price')
+    return float(price) if price else 0.0
+
+def categorize_listings(listings):
+    """Split listings into (active, sold, invalid) with one sold mask over the title and price columns"""
+    df = pd.DataFrame({
+        'title': [listing.get('title') for listing in listings],
+        'price': [listing.get('price') for listing in listings]
+    })
+    price = pd.to_numeric(df['price'], errors='coerce').fillna(0.0)
+    
+    sold_mask = df['title'].str.contains('sold', case=False, na=False) | (price == 0)
+    active_mask = ~sold_mask & (price > 0)
+    invalid_mask = ~sold_mask & ~active_mask
+    
+    def pick(mask):
+        return [listings[i] for i in df.index[mask]]
+    
+    return pick(active_mask), pick(sold_mask), pick(invalid_mask)
+
+def summarize_makes(active_listings, active_prices):
+    """Per-make (make, count, average, deals) for makes with enough listings, largest first"""
+    df = pd.DataFrame({
+        'title': [listing.get('title') for listing in active_listings],
+        'price': active_prices
+    })
+    df['make'] = (
+        df['title'].fillna('').str.extract(MAKE_RE, expand=False)
+        .str.lower().map(MAKE_NORM).str.lower().fillna('unknown')
+    )
+    
+    grp = df.groupby('make', sort=False)['price']
+    df['count'] = grp.transform('size')
+    df['avg'] = grp.transform('mean')
+    df['std'] = grp.transform('std')
+    df['z'] = (df['price'] - df['avg']) / df['std']
+    
+    # Stable sort keeps first-seen order between makes with equal counts
+    counts = grp.size().sort_values(ascending=False, kind='stable')
+    counts = counts[counts >= MIN_LISTINGS_PER_MAKE]
+    
+    deals = df[(df['std'] > 0) & (df['z'] < DEAL_Z_SCORE)]
+    deals = deals.assign(discount=(deals['avg'] - deals['price']) / deals['avg'] * 100)
+    deals_by_make = {
+        make: list(zip(group['title'], group['price'], group['discount']))
+        for make, group in deals.groupby('make', sort=False)
+    }
+    
+    avgs = grp.mean()
+    return [
+        (make, int(count), float(avgs[make]), deals_by_make.get(make, []))
+        for make, count in counts.items()
+    ]
 
 def analyze_with_sold_detection():
     """Analyze listings with proper sold/active categorization"""
@@ -22,21 +84,13 @@ def analyze_with_sold_detection():
     listings = extraction_data['data']
     
     # Categorize listings
-    active_listings = []
-    sold_listings = []
-    invalid_listings = []
+    active_listings, sold_listings, invalid_listings = categorize_listings(listings)
     
-    for listing in listings:
-        title = listing.get('title', '').lower()
-        price = float(listing.get('price', 0)) if listing.get('price') else 0
-        
-        # Detect sold listings
-        if 'sold' in title or price == 0:
-            sold_listings.append(listing)
-        elif price > 0:
-            active_listings.append(listing)
-        else:
-            invalid_listings.append(listing)
+    # Parse each price once; every statistic below reuses these
+    active_prices = [listing_price(l) for l in active_listings]
+    sold_prices = [price for price in map(listing_price, sold_listings) if price > 0]
+    active_avg_price = statistics.fmean(active_prices) if active_prices else 0
+    sold_avg_price = statistics.fmean(sold_prices) if sold_prices else 0
     
     print(f"\nListing Categorization:")
     print(f"   Active listings: {len(active_listings)}")
@@ -47,11 +101,8 @@ def analyze_with_sold_detection():
     if active_listings:
         print(f"\nActive Market Analysis ({len(active_listings)} listings):")
         
-        # Price statistics for active listings only
-        active_prices = [float(l.get('price', 0)) for l in active_listings if l.get('price')]
-        
         if active_prices:
-            avg_price = statistics.mean(active_prices)
+            avg_price = active_avg_price
             median_price = statistics.median(active_prices)
             
             print(f"   Average price: ${avg_price:,.0f}")
@@ -59,58 +110,22 @@ def analyze_with_sold_detection():
             print(f"   Price range: ${min(active_prices):,.0f} - ${max(active_prices):,.0f}")
             
             # Make analysis for active listings
-            make_analysis = defaultdict(list)
-            
-            for listing in active_listings:
-                title = listing.get('title', '').lower()
-                price = float(listing.get('price', 0))
-                
-                make = 'unknown'
-                if 'yamaha' in title:
-                    make = 'yamaha'
-                elif 'sea-doo' in title or 'seadoo' in title:
-                    make = 'sea-doo'
-                elif 'kawasaki' in title:
-                    make = 'kawasaki'
-                
-                make_analysis[make].append({
-                    'price': price,
-                    'title': listing.get('title'),
-                    'listing_id': listing.get('listing_id'),
-                    'url': listing.get('url')
-                })
+            summaries = summarize_makes(active_listings, active_prices)
             
             print(f"\nActive Listings by Make:")
-            for make, listings_by_make in sorted(make_analysis.items(), key=lambda x: len(x[1]), reverse=True):
-                if len(listings_by_make) >= 3:
-                    prices = [l['price'] for l in listings_by_make]
-                    avg_make_price = statistics.mean(prices)
-                    count = len(listings_by_make)
-                    
-                    print(f"   {make.title()}: {count} active listings - Avg: ${avg_make_price:,.0f}")
-                    
-                    # Find genuinely underpriced listings
-                    make_std = statistics.stdev(prices) if len(prices) > 1 else 0
-                    
-                    if make_std > 0:
-                        for listing in listings_by_make:
-                            z_score = (listing['price'] - avg_make_price) / make_std
-                            if z_score < -1.5:  # Significantly below average
-                                discount_pct = ((avg_make_price - listing['price']) / avg_make_price) * 100
-                                print(f"      Potential deal: {listing['title']} - ${listing['price']:,} ({discount_pct:.1f}% below avg)")
+            for make, count, avg_make_price, deals in summaries:
+                print(f"   {make.title()}: {count} active listings - Avg: ${avg_make_price:,.0f}")
+                
+                for title, price, discount_pct in deals:
+                    print(f"      Potential deal: {title} - ${price:,} ({discount_pct:.1f}% below avg)")
     
     # Analyze sold listings for market intelligence
     if sold_listings:
         print(f"\nSold Listings Analysis ({len(sold_listings)} listings):")
         
-        sold_with_prices = [l for l in sold_listings if l.get('price') and float(l.get('price', 0)) > 0]
-        
-        if sold_with_prices:
-            sold_prices = [float(l.get('price')) for l in sold_with_prices]
-            avg_sold_price = statistics.mean(sold_prices)
-            
-            print(f"   Average sold price: ${avg_sold_price:,.0f}")
-            print(f"   Sold listings with pricing data: {len(sold_with_prices)}")
+        if sold_prices:
+            print(f"   Average sold price: ${sold_avg_price:,.0f}")
+            print(f"   Sold listings with pricing data: {len(sold_prices)}")
             
             # Recent sold listings (potential re-list candidates)
             print(f"\nRecent sold listings to monitor:")
@@ -134,15 +149,16 @@ def analyze_with_sold_detection():
         'active_listings': active_listings,
         'sold_listings': sold_listings,
         'market_intelligence': {
-            'active_avg_price': statistics.mean([float(l.get('price', 0)) for l in active_listings if l.get('price')]) if active_listings else 0,
-            'sold_avg_price': statistics.mean([float(l.get('price', 0)) for l in sold_with_prices if l.get('price')]) if sold_with_prices else 0
+            'active_avg_price': active_avg_price,
+            'sold_avg_price': sold_avg_price
         }
     }
     
     # Save filtered datasets
     output_file = f"filtered_market_analysis_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-    with open(output_file, 'w') as f:
-        json.dump(results, f, indent=2)
+    report = json_io.dumps(results, indent=True)
+    with open(output_file, 'wb') as f:
+        f.write(report)
     
     print(f"\nFiltered analysis saved to: {output_file}")
     
@@ -12,10 +12,58 @@ from datetime import datetime
 from typing import Dict, List, Optional, Any
 from playwright.async_api import async_playwright
 import argparse
+from listing_parse import parse_jetski_info
+import json_io
+
+_PRICE_RE = re.compile(r'\$[\d,]+(?:\.\d{2})?')
+_LOC_RE = re.compile(r'([A-Za-z\s]+,\s*[A-Z]{2})')
+
+# Text of every match for each (selector, needle) in priority order, in one round-trip.
+# With a needle only the innermost matches containing it are kept, so page-level
+# containers that merely wrap the text don't come first.
+CANDIDATE_TEXTS_JS = """
+(candidates) => {
+    const texts = [];
+    for (const [selector, needle] of candidates) {
+        let found = [...document.querySelectorAll(selector)];
+        if (needle) {
+            const has = (el) => (el.innerText || '').includes(needle);
+            found = found.filter(el => has(el) && ![...el.querySelectorAll(selector)].some(has));
+        }
+        for (const el of found) texts.push(el.innerText || '');
+    }
+    return texts;
+}
+"""
 
 class FixedMarketplaceEnhancer:
     """Enhanced scraper with stealth configuration and better parsing."""
     
+    def __init__(self, concurrency: int = 8):
+        # Listings processed at once, each on its own page in the shared context
+        self.semaphore = asyncio.Semaphore(concurrency)
+    
+    # Alternative title selectors, joined so the wait is paid once for whichever renders first
+    TITLE_SEL = ', '.join([
+        'h1[data-testid="fb-marketplace-item-details-header-title"]',
+        'h1.x1heor9g',
+        'span[dir="auto"][role="heading"]',
+        'h1 span',
+        '.x1lliihq.x6ikm8r.x10wlt62.x1n2onr6'
+    ])
+    
+    # Price and location candidates as (selector, required text), most specific first
+    PRICE_CANDIDATES = [
+        ('[data-testid="marketplace-item-price-amount"]', None),
+        ('span.x193iq5w.xeuugli.x13faqbe.x1vvkbs.x1s928wv.xhkezso.x1gmr53x.x1cpjm7i.x1fgarty.x1943h6x.x4zkp8e.x676frb.x1nxh6w3.x1sibtaa.xo1l8bm.xi81zsa', None),
+        ('span', '$')
+    ]
+    LOCATION_CANDIDATES = [
+        ('[data-testid="marketplace-item-location"]', None),
+        ('span', ', '),
+        ('div', 'mi away')
+    ]
+    
     async def enhance_listings_from_file(self, input_file: str):
         """Process individual listing URLs from JSON file."""
         
@@ -48,16 +96,17 @@ class FixedMarketplaceEnhancer:
             )
             
             try:
-                enhanced_listings = []
+                tasks = [
+                    self._process_with_limit(context, i, len(listings), listing)
+                    for i, listing in enumerate(listings)
+                ]
+                results = await asyncio.gather(*tasks, return_exceptions=True)
                 
-                for i, listing in enumerate(listings):
-                    print(f"Processing listing {i+1}/{len(listings)}: {listing.get('url', 'No URL')}")
-                    
-                    enhanced = await self._process_single_listing(context, listing)
-                    enhanced_listings.append(enhanced)
-                    
-                    # Random delay to avoid detection
-                    await asyncio.sleep(random.uniform(2, 5))
+                # Keep the original listing for any task that failed outright
+                enhanced_listings = [
+                    listing if isinstance(result, Exception) else result
+                    for listing, result in zip(listings, results)
+                ]
                 
                 # Save results
                 output_file = f"enhanced_tracker_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
@@ -69,8 +118,9 @@ class FixedMarketplaceEnhancer:
                     "data": enhanced_listings
                 }
                 
-                with open(output_file, 'w') as f:
-                    json.dump(output_data, f, indent=2)
+                report = json_io.dumps(output_data, indent=True)
+                with open(output_file, 'wb') as f:
+                    f.write(report)
                 
                 print(f"Enhanced data saved: {output_file}")
                 return output_file
@@ -78,6 +128,16 @@ class FixedMarketplaceEnhancer:
             finally:
                 await browser.close()
     
+    async def _process_with_limit(self, context, index: int, total: int, listing: Dict) -> Dict:
+        """Process a listing once a concurrency slot is free."""
+        async with self.semaphore:
+            print(f"Processing listing {index+1}/{total}: {listing.get('url', 'No URL')}")
+            
+            # Random delay to avoid detection, overlapped with the other slots
+            await asyncio.sleep(random.uniform(0.1, 0.5))
+            
+            return await self._process_single_listing(context, listing)
+    
     async def _process_single_listing(self, context, listing: Dict) -> Dict:
         """Process a single Facebook listing URL."""
         url = listing.get('url', '')
@@ -91,9 +151,6 @@ class FixedMarketplaceEnhancer:
             # Navigate to listing
             await page.goto(url, wait_until="domcontentloaded", timeout=15000)
             
-            # Wait for content to load
-            await asyncio.sleep(random.uniform(1, 3))
-            
             # Extract title
             title = await self._extract_title(page)
             
@@ -130,45 +187,33 @@ class FixedMarketplaceEnhancer:
     
     async def _extract_title(self, page) -> str:
         """Extract listing title with multiple selectors."""
-        selectors = [
-            'h1[data-testid="fb-marketplace-item-details-header-title"]',
-            'h1.x1heor9g',
-            'span[dir="auto"][role="heading"]',
-            'h1 span',
-            '.x1lliihq.x6ikm8r.x10wlt62.x1n2onr6'
-        ]
-        
-        for selector in selectors:
-            try:
-                element = await page.wait_for_selector(selector, timeout=3000)
-                if element:
-                    title = await element.inner_text()
-                    if title and len(title.strip()) > 3:
-                        return title.strip()
-            except:
-                continue
+        try:
+            # Pay the wait once for whichever title element renders first
+            element = await page.wait_for_selector(self.TITLE_SEL, timeout=3000)
+            title = (await element.inner_text()).strip() if element else ""
+            if len(title) > 3:
+                return title
+            
+            # First match was too short to be a title, check the rest
+            for element in await page.query_selector_all(self.TITLE_SEL):
+                title = (await element.inner_text()).strip()
+                if len(title) > 3:
+                    return title
+        except:
+            pass
         
         return ""
     
     async def _extract_price(self, page) -> float:
         """Extract price with improved parsing."""
-        selectors = [
-            '[data-testid="marketplace-item-price-amount"]',
-            'span.x193iq5w.xeuugli.x13faqbe.x1vvkbs.x1s928wv.xhkezso.x1gmr53x.x1cpjm7i.x1fgarty.x1943h6x.x4zkp8e.x676frb.x1nxh6w3.x1sibtaa.xo1l8bm.xi81zsa',
-            'span:has-text("$"):not(:has-text("Save"))'
-        ]
-        
-        for selector in selectors:
-            try:
-                elements = await page.query_selector_all(selector)
-                for element in elements:
-                    text = await element.inner_text()
-                    if '$' in text and 'Save' not in text:
-                        price = self._parse_price_text(text)
-                        if price > 0:
-                            return price
-            except:
-                continue
+        try:
+            for text in await page.evaluate(CANDIDATE_TEXTS_JS, self.PRICE_CANDIDATES):
+                if '$' in text and 'Save' not in text:
+                    price = self._parse_price_text(text)
+                    if price > 0:
+                        return price
+        except:
+            pass
         
         return 0.0
     
@@ -178,7 +223,7 @@ class FixedMarketplaceEnhancer:
             return 0.0
         
         # Find the first price pattern
-        price_match = re.search(r'\$[\d,]+(?:\.\d{2})?', price_text)
+        price_match = _PRICE_RE.search(price_text)
         if price_match:
             # Extract just the matched price
             price_str = price_match.group()
@@ -193,50 +238,20 @@ class FixedMarketplaceEnhancer:
     
     async def _extract_location(self, page) -> str:
         """Extract location information."""
-        selectors = [
-            '[data-testid="marketplace-item-location"]',
-            'span:has-text(", ")',
-            'div:has-text("mi away")'
-        ]
-        
-        for selector in selectors:
-            try:
-                element = await page.query_selector(selector)
-                if element:
-                    text = await element.inner_text()
-                    # Look for city, state pattern
-                    location_match = re.search(r'([A-Za-z\s]+,\s*[A-Z]{2})', text)
-                    if location_match:
-                        return location_match.group(1)
-            except:
-                continue
+        try:
+            for text in await page.evaluate(CANDIDATE_TEXTS_JS, self.LOCATION_CANDIDATES):
+                # Look for city, state pattern
+                location_match = _LOC_RE.search(text)
+                if location_match:
+                    return location_match.group(1)
+        except:
+            pass
         
         return ""
     
     def _parse_jetski_info(self, title: str) -> Dict:
         """Parse jet ski information from title."""
-        title_lower = title.lower()
-        info = {
-            "make": "",
-            "model": "",
-            "year": "",
-            "type": "Jet Ski"
-        }
-        
-        # Extract year
-        year_match = re.search(r'\b(19|20)\d{2}\b', title)
-        if year_match:
-            info["year"] = year_match.group()
-        
-        # Extract make
-        if "seadoo" in title_lower or "sea-doo" in title_lower:
-            info["make"] = "Sea-Doo"
-        elif "yamaha" in title_lower:
-            info["make"] = "Yamaha"
-        elif "kawasaki" in title_lower:
-            info["make"] = "Kawasaki"
-        
-        return info
+        return parse_jetski_info(title)
 
 async def main():
     parser = argparse.ArgumentParser(description="Fixed Facebook Marketplace Enhancer")
@@ -0,0 +1,24 @@
+#!/usr/bin/env python3
+"""
+JSON I/O Helpers
+orjson-backed parsing and serialization, with a stdlib json fallback.
+"""
+
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def loads(data):
+    """Parse JSON from bytes or str"""
+    return orjson.loads(data) if orjson else json.loads(data)
+
+def dumps(obj, indent=False):
+    """Serialize to JSON bytes (compact unless indent)"""
+    if orjson:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+    if indent:
+        return json.dumps(obj, indent=2).encode()
+    return json.dumps(obj, separators=(',', ':')).encode()
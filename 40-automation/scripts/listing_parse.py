@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Listing Title Parsing
+Shared jet ski make/year parsing for the enhancer and analysis scripts.
+"""
+
+import re
+from functools import lru_cache
+from typing import Dict, Tuple
+
+YEAR_RE = re.compile(r'\b(?:19|20)\d{2}\b')
+
+# One scan of the title finds whichever make is mentioned first
+MAKE_RE = re.compile(r'(yamaha|sea[- ]?doo|kawasaki)', re.I)
+MAKE_NORM = {
+    'yamaha': 'Yamaha',
+    'sea-doo': 'Sea-Doo',
+    'seadoo': 'Sea-Doo',
+    'sea doo': 'Sea-Doo',
+    'kawasaki': 'Kawasaki'
+}
+
+@lru_cache(maxsize=4096)
+def parse_title(title: str) -> Tuple[str, str]:
+    """(make, year) named in the title, empty strings when absent.
+    
+    Cached, since the same titles come back across collection and analysis runs.
+    """
+    make_match = MAKE_RE.search(title)
+    year_match = YEAR_RE.search(title)
+    return (
+        MAKE_NORM[make_match.group(1).lower()] if make_match else "",
+        year_match.group() if year_match else ""
+    )
+
+def parse_jetski_info(title: str) -> Dict:
+    """Parse jet ski information from title."""
+    make, year = parse_title(title)
+    return {
+        "make": make,
+        "model": "",
+        "year": year,
+        "type": "Jet Ski"
+    }
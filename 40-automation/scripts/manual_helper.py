@@ -6,6 +6,8 @@ Guides user through manual data entry with intelligent parsing.
 
 import json
 from datetime import datetime
+from listing_parse import parse_jetski_info
+import json_io
 
 def manual_enhance_listings(input_file: str):
     """Guide user through manual enhancement of listings."""
@@ -61,34 +63,13 @@ def manual_enhance_listings(input_file: str):
         "data": enhanced_listings
     }
     
-    with open(output_file, 'w') as f:
-        json.dump(output_data, f, indent=2)
+    report = json_io.dumps(output_data, indent=True)
+    with open(output_file, 'wb') as f:
+        f.write(report)
     
     print(f"\nEnhanced data saved: {output_file}")
     print("Ready to import into your tracker!")
 
-def parse_jetski_info(title: str):
-    """Parse jet ski info from title."""
-    import re
-    
-    title_lower = title.lower()
-    info = {"make": "", "model": "", "year": "", "type": "Jet Ski"}
-    
-    # Extract year
-    year_match = re.search(r'\b(19|20)\d{2}\b', title)
-    if year_match:
-        info["year"] = year_match.group()
-    
-    # Extract make
-    if "seadoo" in title_lower or "sea-doo" in title_lower:
-        info["make"] = "Sea-Doo"
-    elif "yamaha" in title_lower:
-        info["make"] = "Yamaha"
-    elif "kawasaki" in title_lower:
-        info["make"] = "Kawasaki"
-    
-    return info
-
 if __name__ == "__main__":
     import sys
     if len(sys.argv) != 2:
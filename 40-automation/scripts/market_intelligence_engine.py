@@ -7,26 +7,174 @@ Extensible for any product category beyond jet skis
 
 import json
 import re
+import time
 from datetime import datetime, timedelta
-from collections import defaultdict, Counter
-import statistics
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import combinations
 import logging
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from functools import lru_cache
 from typing import List, Dict, Any, Optional
 import geopy.distance
+from geopy.exc import GeopyError
+from geopy.geocoders import Nominatim
+import numpy as np
+import pandas as pd
+import json_io
+
+try:
+    from datasketch import MinHash, MinHashLSH
+except ImportError:  # pairwise Jaccard fallback
+    MinHash = MinHashLSH = None
+
+try:
+    import ahocorasick
+except ImportError:  # per-model substring checks fallback
+    ahocorasick = None
+
+try:
+    from sklearn.neighbors import BallTree
+except ImportError:  # brute-force haversine fallback
+    BallTree = None
+
+try:
+    from numba import njit
+except ImportError:  # kernels below are plain NumPy and run as-is
+    def njit(*args, **kwargs):
+        return lambda fn: fn
 
 logger = logging.getLogger(__name__)
 
-@dataclass
+# Model keywords recognized in titles, and each one's slot in per-model counts
+_MODELS = ('vx', 'fx', 'gp', 'gtr', 'gtx', 'gti', 'rxt', 'svho', 'cruiser', 'deluxe', 'wake')
+_MODEL_INDEX = {model: i for i, model in enumerate(_MODELS)}
+
+# Models tracked for popularity trends, matched anywhere in the title
+_TREND_MODELS = ('svho', 'cruiser', 'deluxe', 'wake', 'gtr', 'gtx', 'rxt', 'gti')
+if ahocorasick is not None:
+    _TREND_AUTOMATON = ahocorasick.Automaton()
+    for _model in _TREND_MODELS:
+        _TREND_AUTOMATON.add_word(_model, _model)
+    _TREND_AUTOMATON.make_automaton()
+else:
+    _TREND_AUTOMATON = None
+
+# Title/location patterns, compiled once for the per-listing loops
+_TITLE_RE = re.compile(
+    r'(?P<make>yamaha|sea-?doo|kawasaki|honda|polaris)'
+    r'|(?P<year>20\d{2}|19\d{2})'
+    rf'|(?P<model>{"|".join(_MODELS)})'
+)
+_MILES_RE = re.compile(r'\d+\s*miles?\s*away')
+_COMMA_TO_SPACE = str.maketrans(',', ' ')
+
+def _trend_models_in(title: str) -> set:
+    """Trend models mentioned in a lowercased title, found in a single pass when possible"""
+    if _TREND_AUTOMATON is not None:
+        return {model for _, model in _TREND_AUTOMATON.iter(title)}
+    return {model for model in _TREND_MODELS if model in title}
+
+def _most_common(values):
+    """(value, count) of the most frequent non-empty value, earliest on ties; (None, 0) if none"""
+    values = np.array([v for v in values if v])
+    if not len(values):
+        return None, 0
+    uniques, first, counts = np.unique(values, return_index=True, return_counts=True)
+    tied = np.flatnonzero(counts == counts.max())
+    best = tied[np.argmin(first[tied])]
+    return str(uniques[best]), int(counts[best])
+
+def _linked_groups(n, pairs):
+    """Groups of 2+ positions in range(n) connected by pairs (union-find), each in position order"""
+    parent = list(range(n))
+    
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+    
+    for a, b in pairs:
+        ra, rb = find(a), find(b)
+        if ra != rb:
+            parent[max(ra, rb)] = min(ra, rb)
+    
+    groups = defaultdict(list)
+    for i in range(n):
+        groups[find(i)].append(i)
+    return [group for group in groups.values() if len(group) > 1]
+
+EARTH_RADIUS_KM = 6371.0
+CLUSTER_RADIUS_KM = 25
+
+
+def _haversine(a, b):
+    """Great-circle distance in radians between (lat, lon) points given in radians"""
+    dlat = b[..., 0] - a[..., 0]
+    dlon = b[..., 1] - a[..., 1]
+    h = np.sin(dlat / 2) ** 2 + np.cos(a[..., 0]) * np.cos(b[..., 0]) * np.sin(dlon / 2) ** 2
+    return 2 * np.arcsin(np.sqrt(np.minimum(h, 1.0)))
+
+
+@njit(cache=True, nogil=True)
+def _group_medians(group_ids, values, n_groups):
+    """Median of values within each (non-empty) group"""
+    order = np.argsort(values, kind='mergesort')
+    order = order[np.argsort(group_ids[order], kind='mergesort')]
+    sorted_values = values[order]
+    counts = np.bincount(group_ids, minlength=n_groups)
+    starts = np.cumsum(counts) - counts
+    return (sorted_values[starts + (counts - 1) // 2] + sorted_values[starts + counts // 2]) / 2
+
+
+@njit(cache=True, nogil=True)
+def _group_robust_zscores(group_ids, prices, n_groups):
+    """Per-listing group size, group mean and median/MAD robust z-score
+    
+    When more than half a group shares one price its MAD is 0, so the scale falls
+    back to the mean absolute deviation from the median (1.2533 * meanAD). Only a
+    group of identical prices gets z = 0.
+    """
+    counts = np.bincount(group_ids, minlength=n_groups)
+    means = np.bincount(group_ids, prices, n_groups) / np.maximum(counts, 1)
+    dev = prices - _group_medians(group_ids, prices, n_groups)[group_ids]
+    abs_dev = np.abs(dev)
+    mad = _group_medians(group_ids, abs_dev, n_groups)[group_ids]
+    mean_ad = (np.bincount(group_ids, abs_dev, n_groups) / np.maximum(counts, 1))[group_ids]
+    fallback = np.where(mean_ad > 0, dev / np.where(mean_ad > 0, 1.2533 * mean_ad, 1.0), 0.0)
+    z = np.where(mad > 0, 0.6745 * dev / np.where(mad > 0, mad, 1.0), fallback)
+    return counts[group_ids], means[group_ids], z
+
+
+@njit(cache=True, nogil=True)
+def _depreciation_rates(ages, prices):
+    """Year-over-year depreciation between consecutive ages with 2+ listings each
+    
+    Returns (ages, mean prices, rates) for every age whose previous age also
+    qualifies, plus the number of qualifying ages.
+    """
+    base = ages.min()
+    counts = np.bincount(ages - base)
+    means = np.bincount(ages - base, prices) / np.maximum(counts, 1)
+    valid = counts >= 2
+    has_prev = valid[1:] & valid[:-1]
+    prev = means[:-1][has_prev]
+    cur = means[1:][has_prev]
+    rates = np.where(prev > 0, (prev - cur) / np.where(prev > 0, prev, 1.0), 0.0)
+    return np.nonzero(has_prev)[0] + 1 + base, cur, rates, valid.sum()
+
+
+@dataclass(slots=True, frozen=True)
 class MarketPattern:
-    """Represents a detected market pattern"""
+    """Represents a detected market pattern (hashed on its scalar fields)"""
     pattern_type: str
     confidence: float
     description: str
-    affected_listings: List[str]
+    affected_listings: List[str] = field(hash=False)
     potential_value: Optional[float] = None
     actionable_insight: Optional[str] = None
-    supporting_data: Optional[Dict] = None
+    supporting_data: Optional[Dict] = field(default=None, hash=False)
 
 class MarketIntelligenceEngine:
     """
@@ -41,64 +189,108 @@ class MarketIntelligenceEngine:
     """
     
     def __init__(self):
-        self.patterns_db = "market_patterns.json"
+        self.patterns_db = "market_patterns.jsonl"
         self.intelligence_cache = "market_intelligence_cache.json"
+        self._cache_data = None
         
     def analyze_market_patterns(self, listings_data: List[Dict]) -> List[MarketPattern]:
         """
         Main analysis method - detects all market patterns
         """
-        patterns = []
-        
-        # Geographic analysis
-        patterns.extend(self._detect_geographic_clusters(listings_data))
-        
-        # Seasonal patterns
-        patterns.extend(self._detect_seasonal_patterns(listings_data))
-        
-        # Seller behavior analysis
-        patterns.extend(self._detect_seller_patterns(listings_data))
-        
-        # Fleet liquidation detection
-        patterns.extend(self._detect_fleet_liquidation(listings_data))
-        
-        # Price anomaly detection
-        patterns.extend(self._detect_price_anomalies(listings_data))
-        
-        # Market timing analysis
-        patterns.extend(self._detect_market_timing_opportunities(listings_data))
-        
-        # Trend analysis
-        patterns.extend(self._detect_emerging_trends(listings_data))
+        cols = self._listing_columns(listings_data)
+        
+        detectors = (
+            self._detect_geographic_clusters,           # Geographic analysis
+            self._detect_seasonal_patterns,             # Seasonal patterns
+            self._detect_seller_patterns,               # Seller behavior analysis
+            self._detect_fleet_liquidation,             # Fleet liquidation detection
+            self._detect_price_anomalies,               # Price anomaly detection
+            self._detect_market_timing_opportunities,   # Market timing analysis
+            self._detect_emerging_trends,               # Trend analysis
+            self._detect_cross_seller_templates,        # Shared descriptions across sellers
+        )
+        
+        # Detectors only read the shared columns, so run them side by side;
+        # results are collected in detector order
+        with ThreadPoolExecutor(max_workers=len(detectors)) as executor:
+            futures = [executor.submit(detector, cols) for detector in detectors]
+            patterns = [pattern for future in futures for pattern in future.result()]
+        
+        # Drop repeated patterns, keeping first occurrences in order
+        patterns = list(dict.fromkeys(patterns))
         
         # Save patterns for historical analysis
         self._save_patterns(patterns)
         
         return sorted(patterns, key=lambda x: x.confidence, reverse=True)
     
-    def _detect_geographic_clusters(self, listings: List[Dict]) -> List[MarketPattern]:
+    def _listing_columns(self, listings: List[Dict]) -> Dict[str, Any]:
+        """Extract every field the detectors use into per-field columns, in one pass
+        
+        Prices are float64 with NaN where missing/zero, dates a UTC DatetimeIndex
+        (NaT where missing/invalid). Titles are lowercased and parsed once into
+        make, year (first found, or None) and every model keyword in title order;
+        descriptions are also tokenized once into lowercase word sets. 'frame'
+        holds the groupable columns as a DataFrame indexed by listing position.
+        """
+        titles, makes, years, models = [], [], [], []
+        for listing in listings:
+            title = listing.get('title', '').lower()
+            make = year = None
+            title_models = []
+            for match in _TITLE_RE.finditer(title):
+                kind = match.lastgroup
+                if kind == 'model':
+                    title_models.append(match.group())
+                elif kind == 'make':
+                    make = make or match.group()
+                else:
+                    year = year or match.group()
+            titles.append(title)
+            makes.append(make)
+            years.append(year)
+            models.append(tuple(title_models))
+        
+        cols = {
+            'id': np.array([l.get('id') for l in listings], dtype=object),
+            'price': np.array([l.get('price') or np.nan for l in listings], dtype=np.float64),
+            'title': titles,
+            'make': makes,
+            'year': years,
+            'models': models,
+            'seller': [l.get('seller', 'Unknown') for l in listings],
+            'location': [self._normalize_location(l.get('location', '')) for l in listings],
+            'description': [l.get('description') or '' for l in listings],
+            'desc_tokens': [frozenset((l.get('description') or '').lower().split()) for l in listings],
+            'date': pd.to_datetime([l.get('addedDate') or l.get('first_seen') for l in listings],
+                                   utc=True, errors='coerce', format='ISO8601'),
+        }
+        cols['frame'] = pd.DataFrame({key: cols[key] for key in ('price', 'make', 'year', 'seller', 'location', 'date')})
+        return cols
+    
+    def _detect_geographic_clusters(self, cols: Dict[str, Any]) -> List[MarketPattern]:
         """Detect geographic price clustering and arbitrage opportunities"""
         patterns = []
+        if len(cols['id']) < 3:  # No location can reach the 3-listing minimum
+            return patterns
         
-        # Group listings by location
-        location_groups = defaultdict(list)
-        for listing in listings:
-            location = self._normalize_location(listing.get('location', ''))
-            if location:
-                location_groups[location].append(listing)
+        # Group listings by 25 km location cluster (by name where a location can't be geocoded)
+        locations = cols['location']
+        cluster_names = self._cluster_locations(list(dict.fromkeys(loc for loc in locations if loc)))
+        
+        by_location = cols['frame']['price'].groupby(cols['frame']['location'].map(cluster_names), sort=False)
+        stats = by_location.agg(n='size', priced='count', avg_price='mean', median_price='median')
         
-        # Analyze price variations by location
+        # Analyze price variations by location (need minimum for statistical significance)
         location_stats = {}
-        for location, loc_listings in location_groups.items():
-            if len(loc_listings) >= 3:  # Need minimum for statistical significance
-                prices = [l.get('price', 0) for l in loc_listings if l.get('price')]
-                if prices:
-                    location_stats[location] = {
-                        'avg_price': statistics.mean(prices),
-                        'median_price': statistics.median(prices),
-                        'count': len(loc_listings),
-                        'listings': loc_listings
-                    }
+        for location, row in zip(stats.index, stats.itertuples(index=False)):
+            if row.n >= 3 and row.priced:
+                location_stats[location] = {
+                    'avg_price': float(row.avg_price),
+                    'median_price': float(row.median_price),
+                    'count': int(row.n),
+                    'listings': by_location.indices[location]
+                }
         
         # Find arbitrage opportunities
         if len(location_stats) >= 2:
@@ -115,7 +307,7 @@ class MarketIntelligenceEngine:
                     pattern_type="geographic_arbitrage",
                     confidence=0.8,
                     description=f"Geographic price arbitrage: {highest[0]} averages ${highest[1]['avg_price']:,.0f} vs {lowest[0]} at ${lowest[1]['avg_price']:,.0f}",
-                    affected_listings=[l['id'] for l in lowest[1]['listings']],
+                    affected_listings=cols['id'][lowest[1]['listings']].tolist(),
                     potential_value=price_diff,
                     actionable_insight=f"Consider buying in {lowest[0]} area and selling in {highest[0]} area",
                     supporting_data={
@@ -129,14 +321,14 @@ class MarketIntelligenceEngine:
         # Detect high-density clusters (potential fleet sales)
         for location, stats in location_stats.items():
             if stats['count'] >= 5:  # High concentration
-                similar_models = self._find_similar_models(stats['listings'])
+                similar_models = self._find_similar_models([cols['models'][i] for i in stats['listings']])
                 
                 if len(similar_models) >= 3:
                     patterns.append(MarketPattern(
                         pattern_type="high_density_cluster",
                         confidence=0.7,
                         description=f"High concentration cluster in {location}: {stats['count']} listings with similar models",
-                        affected_listings=[l['id'] for l in stats['listings']],
+                        affected_listings=cols['id'][stats['listings']].tolist(),
                         actionable_insight="Investigate for potential fleet liquidation or dealer inventory",
                         supporting_data={
                             'location': location,
@@ -147,123 +339,104 @@ class MarketIntelligenceEngine:
         
         return patterns
     
-    def _detect_seasonal_patterns(self, listings: List[Dict]) -> List[MarketPattern]:
+    def _detect_seasonal_patterns(self, cols: Dict[str, Any]) -> List[MarketPattern]:
         """Detect seasonal listing patterns and timing opportunities"""
         patterns = []
         
         # Analyze listing dates and prices by month
-        monthly_data = defaultdict(list)
-        current_date = datetime.now()
+        months = cols['frame']['date'].dt.month
+        if months.nunique() < 3:  # Need data from multiple months
+            return patterns
         
-        for listing in listings:
-            added_date = listing.get('addedDate') or listing.get('first_seen')
-            if added_date:
-                try:
-                    date_obj = datetime.fromisoformat(added_date.replace('Z', '+00:00'))
-                    month = date_obj.month
-                    monthly_data[month].append(listing)
-                except:
-                    continue
+        by_month = cols['frame']['price'].groupby(months, sort=False)
+        stats = by_month.agg(n='size', priced='count', avg_price='mean')
         
         # Analyze seasonal trends
-        if len(monthly_data) >= 3:  # Need data from multiple months
-            monthly_stats = {}
-            for month, month_listings in monthly_data.items():
-                prices = [l.get('price', 0) for l in month_listings if l.get('price')]
-                if prices:
-                    monthly_stats[month] = {
-                        'avg_price': statistics.mean(prices),
-                        'count': len(month_listings),
-                        'listings': month_listings
-                    }
-            
-            # Detect end-of-season dumps (typically fall months)
-            fall_months = [9, 10, 11]  # Sept, Oct, Nov
-            spring_months = [3, 4, 5]   # Mar, Apr, May
+        monthly_stats = {}
+        for month, row in zip(stats.index, stats.itertuples(index=False)):
+            if row.priced:
+                monthly_stats[int(month)] = {
+                    'avg_price': float(row.avg_price),
+                    'count': int(row.n),
+                    'listings': by_month.indices[month]
+                }
+        
+        # Detect end-of-season dumps (typically fall months)
+        fall_months = [9, 10, 11]  # Sept, Oct, Nov
+        spring_months = [3, 4, 5]   # Mar, Apr, May
+        
+        fall_data = [stats for month, stats in monthly_stats.items() if month in fall_months]
+        spring_data = [stats for month, stats in monthly_stats.items() if month in spring_months]
+        
+        if fall_data and spring_data:
+            fall_avg = float(np.mean([d['avg_price'] for d in fall_data]))
+            spring_avg = float(np.mean([d['avg_price'] for d in spring_data]))
             
-            fall_data = [stats for month, stats in monthly_stats.items() if month in fall_months]
-            spring_data = [stats for month, stats in monthly_stats.items() if month in spring_months]
+            price_diff_pct = ((spring_avg - fall_avg) / fall_avg) * 100 if fall_avg > 0 else 0
             
-            if fall_data and spring_data:
-                fall_avg = statistics.mean([d['avg_price'] for d in fall_data])
-                spring_avg = statistics.mean([d['avg_price'] for d in spring_data])
-                
-                price_diff_pct = ((spring_avg - fall_avg) / fall_avg) * 100 if fall_avg > 0 else 0
-                
-                if price_diff_pct > 10:  # Significant seasonal variation
-                    patterns.append(MarketPattern(
-                        pattern_type="seasonal_pricing",
-                        confidence=0.75,
-                        description=f"Seasonal price variation detected: Fall avg ${fall_avg:,.0f} vs Spring avg ${spring_avg:,.0f}",
-                        affected_listings=[l['id'] for month_data in fall_data for l in month_data['listings']],
-                        potential_value=spring_avg - fall_avg,
-                        actionable_insight="Buy in fall/winter months, sell in spring/summer for seasonal arbitrage",
-                        supporting_data={
-                            'fall_average': fall_avg,
-                            'spring_average': spring_avg,
-                            'seasonal_premium': price_diff_pct
-                        }
-                    ))
+            if price_diff_pct > 10:  # Significant seasonal variation
+                patterns.append(MarketPattern(
+                    pattern_type="seasonal_pricing",
+                    confidence=0.75,
+                    description=f"Seasonal price variation detected: Fall avg ${fall_avg:,.0f} vs Spring avg ${spring_avg:,.0f}",
+                    affected_listings=cols['id'][np.concatenate([d['listings'] for d in fall_data])].tolist(),
+                    potential_value=spring_avg - fall_avg,
+                    actionable_insight="Buy in fall/winter months, sell in spring/summer for seasonal arbitrage",
+                    supporting_data={
+                        'fall_average': fall_avg,
+                        'spring_average': spring_avg,
+                        'seasonal_premium': price_diff_pct
+                    }
+                ))
         
         return patterns
     
-    def _detect_seller_patterns(self, listings: List[Dict]) -> List[MarketPattern]:
+    def _detect_seller_patterns(self, cols: Dict[str, Any]) -> List[MarketPattern]:
         """Detect seller behavior patterns"""
         patterns = []
+        if len(cols['id']) < 3:  # No seller can reach the 3-listing minimum
+            return patterns
         
-        # Group by seller
-        seller_groups = defaultdict(list)
-        for listing in listings:
-            seller = listing.get('seller', 'Unknown')
-            if seller and seller != 'Unknown':
-                seller_groups[seller].append(listing)
+        # Group listing dates by named seller
+        sellers = cols['frame']['seller']
+        named = sellers.where(sellers.notna() & ~sellers.isin(['', 'Unknown']))
+        by_seller = cols['frame']['date'].groupby(named, sort=False)
+        stats = by_seller.agg(n='size', dated='count', first='min', last='max')
         
         # Analyze seller patterns
-        for seller, seller_listings in seller_groups.items():
-            if len(seller_listings) >= 3:  # Multiple listings from same seller
+        for seller, row in zip(stats.index, stats.itertuples(index=False)):
+            if row.n >= 3:  # Multiple listings from same seller
+                idx = by_seller.indices[seller]
                 
                 # Check for rapid listing pattern (potential dealer/flipper)
-                dates = []
-                for listing in seller_listings:
-                    date_str = listing.get('addedDate') or listing.get('first_seen')
-                    if date_str:
-                        try:
-                            dates.append(datetime.fromisoformat(date_str.replace('Z', '+00:00')))
-                        except:
-                            continue
-                
-                if len(dates) >= 3:
-                    date_range = max(dates) - min(dates)
+                if row.dated >= 3:
+                    date_range = row.last - row.first
                     
                     if date_range <= timedelta(days=30):  # Multiple listings within 30 days
                         patterns.append(MarketPattern(
                             pattern_type="high_volume_seller",
                             confidence=0.6,
-                            description=f"High-volume seller pattern: {seller} listed {len(seller_listings)} items within {date_range.days} days",
-                            affected_listings=[l['id'] for l in seller_listings],
+                            description=f"High-volume seller pattern: {seller} listed {len(idx)} items within {date_range.days} days",
+                            affected_listings=cols['id'][idx].tolist(),
                             actionable_insight="Investigate for potential dealer pricing or bulk purchase opportunities",
                             supporting_data={
                                 'seller': seller,
-                                'listing_count': len(seller_listings),
+                                'listing_count': len(idx),
                                 'time_span_days': date_range.days
                             }
                         ))
                 
                 # Check for similar descriptions (copy-paste pattern)
-                descriptions = [l.get('description', '') for l in seller_listings]
+                descriptions = [cols['desc_tokens'][i] for i in idx]
                 if len(descriptions) >= 2:
-                    similar_desc_count = 0
-                    for i, desc1 in enumerate(descriptions):
-                        for desc2 in descriptions[i+1:]:
-                            if self._text_similarity(desc1, desc2) > 0.8:
-                                similar_desc_count += 1
+                    similar_desc_count = self._count_similar_pairs(descriptions, 0.8)
                     
                     if similar_desc_count >= 2:
                         patterns.append(MarketPattern(
                             pattern_type="template_seller",
                             confidence=0.7,
                             description=f"Template/dealer pattern: {seller} uses similar descriptions across multiple listings",
-                            affected_listings=[l['id'] for l in seller_listings],
+                            affected_listings=cols['id'][idx].tolist(),
                             actionable_insight="Likely commercial seller - may have negotiation flexibility",
                             supporting_data={
                                 'seller': seller,
@@ -273,75 +446,63 @@ class MarketIntelligenceEngine:
         
         return patterns
     
-    def _detect_fleet_liquidation(self, listings: List[Dict]) -> List[MarketPattern]:
+    def _detect_fleet_liquidation(self, cols: Dict[str, Any]) -> List[MarketPattern]:
         """Detect potential fleet liquidation events"""
         patterns = []
+        if len(cols['id']) < 4:  # No cluster can reach the 4-listing fleet threshold
+            return patterns
         
-        # Look for clusters of similar year/make/model with similar conditions
-        model_clusters = defaultdict(list)
+        # Descriptions mentioning fleet/rental/commercial
+        fleet_keywords = ['fleet', 'rental', 'commercial', 'business', 'rebuilt', 'refurbished', 'hours']
+        mentions_fleet = [any(keyword in f"{desc.lower()} {title}" for keyword in fleet_keywords)
+                          for desc, title in zip(cols['description'], cols['title'])]
         
-        for listing in listings:
-            title = listing.get('title', '').lower()
-            
-            # Extract key identifiers
-            make_match = re.search(r'(yamaha|sea-?doo|kawasaki|honda|polaris)', title)
-            year_match = re.search(r'(20\d{2}|19\d{2})', title)
-            
-            if make_match and year_match:
-                key = f"{make_match.group(1)}_{year_match.group(1)}"
-                model_clusters[key].append(listing)
+        # Look for clusters of similar year/make/model with similar conditions
+        by_model = cols['frame'].assign(fleet=mentions_fleet).groupby(['make', 'year'], sort=False)
+        stats = by_model.agg(n=('price', 'size'), fleet_desc_count=('fleet', 'sum'), priced=('price', 'count'),
+                             avg_price=('price', 'mean'), price_sd=('price', 'std'))
         
         # Analyze clusters for fleet patterns
-        for model_key, cluster_listings in model_clusters.items():
-            if len(cluster_listings) >= 4:  # Threshold for potential fleet
+        for (make, year), row in zip(stats.index, stats.itertuples(index=False)):
+            if row.n >= 4:  # Threshold for potential fleet
+                model_key = f"{make}_{year}"
+                idx = by_model.indices[(make, year)]
                 
                 # Check for fleet indicators
                 fleet_indicators = []
                 
-                # Similar descriptions mentioning fleet/rental/commercial
-                fleet_keywords = ['fleet', 'rental', 'commercial', 'business', 'rebuilt', 'refurbished', 'hours']
-                fleet_desc_count = 0
-                
-                for listing in cluster_listings:
-                    desc = (listing.get('description', '') + ' ' + listing.get('title', '')).lower()
-                    if any(keyword in desc for keyword in fleet_keywords):
-                        fleet_desc_count += 1
-                
+                fleet_desc_count = int(row.fleet_desc_count)
                 if fleet_desc_count >= 2:
                     fleet_indicators.append(f"{fleet_desc_count} listings mention fleet/rental keywords")
                 
                 # Similar pricing pattern
-                prices = [l.get('price', 0) for l in cluster_listings if l.get('price')]
-                if len(prices) >= 3:
-                    price_cv = statistics.stdev(prices) / statistics.mean(prices) if statistics.mean(prices) > 0 else 0
+                avg_price = float(row.avg_price) if row.priced else 0
+                if row.priced >= 3:
+                    price_cv = float(row.price_sd) / avg_price if avg_price > 0 else 0
                     if price_cv < 0.15:  # Low price variation (similar pricing)
                         fleet_indicators.append(f"Similar pricing pattern (CV: {price_cv:.2f})")
                 
                 # Geographic clustering
-                locations = [self._normalize_location(l.get('location', '')) for l in cluster_listings]
-                location_counter = Counter([loc for loc in locations if loc])
-                if location_counter and location_counter.most_common(1)[0][1] >= 3:
-                    fleet_indicators.append(f"Geographic clustering in {location_counter.most_common(1)[0][0]}")
+                top_location, location_count = _most_common(cols['location'][i] for i in idx)
+                if location_count >= 3:
+                    fleet_indicators.append(f"Geographic clustering in {top_location}")
                 
                 # Seller clustering
-                sellers = [l.get('seller', '') for l in cluster_listings]
-                seller_counter = Counter([seller for seller in sellers if seller])
-                if seller_counter and seller_counter.most_common(1)[0][1] >= 2:
-                    fleet_indicators.append(f"Multiple listings from {seller_counter.most_common(1)[0][0]}")
+                top_seller, seller_count = _most_common(cols['seller'][i] for i in idx)
+                if seller_count >= 2:
+                    fleet_indicators.append(f"Multiple listings from {top_seller}")
                 
                 if len(fleet_indicators) >= 2:  # Multiple indicators suggest fleet liquidation
-                    avg_price = statistics.mean(prices) if prices else 0
-                    
                     patterns.append(MarketPattern(
                         pattern_type="fleet_liquidation",
                         confidence=0.8,
-                        description=f"Potential fleet liquidation: {len(cluster_listings)} similar {model_key.replace('_', ' ')} units",
-                        affected_listings=[l['id'] for l in cluster_listings],
+                        description=f"Potential fleet liquidation: {len(idx)} similar {model_key.replace('_', ' ')} units",
+                        affected_listings=cols['id'][idx].tolist(),
                         potential_value=avg_price * 0.15,  # Estimate 15% below market discount
                         actionable_insight="Investigate bulk purchase opportunity or expect below-market pricing",
                         supporting_data={
                             'model': model_key.replace('_', ' '),
-                            'count': len(cluster_listings),
+                            'count': len(idx),
                             'indicators': fleet_indicators,
                             'average_price': avg_price
                         }
@@ -349,175 +510,136 @@ class MarketIntelligenceEngine:
         
         return patterns
     
-    def _detect_price_anomalies(self, listings: List[Dict]) -> List[MarketPattern]:
+    def _detect_price_anomalies(self, cols: Dict[str, Any]) -> List[MarketPattern]:
         """Detect pricing anomalies and potential deals/overpricing"""
         patterns = []
-        
-        # Group similar models
-        model_groups = defaultdict(list)
-        
-        for listing in listings:
-            title = listing.get('title', '').lower()
+        if len(cols['id']) < 3:  # No model group can reach the 3-listing minimum
+            return patterns
+        
+        # Model signature per listing ('wake' is not a distinct model for pricing)
+        df = pd.DataFrame({
+            'make': cols['make'],
+            'year': cols['year'],
+            'model': [next((m for m in models if m != 'wake'), None) for models in cols['models']],
+            'price': cols['price'],
+        })
+        
+        df = df[df['make'].notna() & df['year'].notna() & df['price'].notna()]
+        if df.empty:
+            return patterns
+        
+        df['key'] = df['make'] + '_' + df['year'] + ('_' + df['model']).fillna('')
+        
+        # Per-model mean and median/MAD z-scores in one kernel pass (groups in first-seen order).
+        # Median and MAD aren't pulled toward the outliers being looked for, unlike mean/stdev.
+        group_ids, group_keys = pd.factorize(df['key'])
+        df['group'] = group_ids
+        df['n'], df['mu'], df['z'] = _group_robust_zscores(group_ids, df['price'].to_numpy(), len(group_keys))
+        
+        # Need minimum for comparison; significant outliers have a robust z beyond 3.5
+        anomalies = df[(df['n'] >= 3) & (df['z'].abs() > 3.5)].sort_values('group', kind='stable')
+        
+        for idx, model_key, price, mean_price, z_score in zip(anomalies.index, anomalies['key'], anomalies['price'],
+                                                              anomalies['mu'], anomalies['z']):
+            listing_id = cols['id'][idx]
+            price = float(price)
+            mean_price = float(mean_price)
+            z_score = float(z_score)
             
-            # Create model signature
-            make_match = re.search(r'(yamaha|sea-?doo|kawasaki|honda|polaris)', title)
-            year_match = re.search(r'(20\d{2}|19\d{2})', title)
-            model_match = re.search(r'(vx|fx|gp|gtr|gtx|gti|rxt|svho|cruiser|deluxe)', title)
+            if z_score < -3.5:  # Underpriced
+                discount_pct = ((mean_price - price) / mean_price) * 100
+                patterns.append(MarketPattern(
+                    pattern_type="underpriced_opportunity",
+                    confidence=0.85,
+                    description=f"Underpriced {model_key.replace('_', ' ')}: ${price:,.0f} vs market avg ${mean_price:,.0f} ({discount_pct:.0f}% below market)",
+                    affected_listings=[listing_id],
+                    potential_value=mean_price - price,
+                    actionable_insight=f"Strong buy opportunity - {discount_pct:.0f}% below market price",
+                    supporting_data={
+                        'model': model_key.replace('_', ' '),
+                        'listed_price': price,
+                        'market_average': mean_price,
+                        'discount_percentage': discount_pct,
+                        'z_score': z_score
+                    }
+                ))
             
-            if make_match and year_match:
-                key = f"{make_match.group(1)}_{year_match.group(1)}"
-                if model_match:
-                    key += f"_{model_match.group(1)}"
-                
-                if listing.get('price'):
-                    model_groups[key].append(listing)
-        
-        # Analyze pricing within each model group
-        for model_key, model_listings in model_groups.items():
-            if len(model_listings) >= 3:  # Need minimum for comparison
-                prices = [l['price'] for l in model_listings]
-                
-                mean_price = statistics.mean(prices)
-                median_price = statistics.median(prices)
-                std_dev = statistics.stdev(prices) if len(prices) > 1 else 0
-                
-                # Find outliers (beyond 2 standard deviations)
-                for listing in model_listings:
-                    price = listing['price']
-                    z_score = (price - mean_price) / std_dev if std_dev > 0 else 0
-                    
-                    if abs(z_score) > 2:  # Significant outlier
-                        if z_score < -2:  # Underpriced
-                            discount_pct = ((mean_price - price) / mean_price) * 100
-                            patterns.append(MarketPattern(
-                                pattern_type="underpriced_opportunity",
-                                confidence=0.85,
-                                description=f"Underpriced {model_key.replace('_', ' ')}: ${price:,} vs market avg ${mean_price:,.0f} ({discount_pct:.0f}% below market)",
-                                affected_listings=[listing['id']],
-                                potential_value=mean_price - price,
-                                actionable_insight=f"Strong buy opportunity - {discount_pct:.0f}% below market price",
-                                supporting_data={
-                                    'model': model_key.replace('_', ' '),
-                                    'listed_price': price,
-                                    'market_average': mean_price,
-                                    'discount_percentage': discount_pct,
-                                    'z_score': z_score
-                                }
-                            ))
-                        
-                        elif z_score > 2:  # Overpriced
-                            premium_pct = ((price - mean_price) / mean_price) * 100
-                            patterns.append(MarketPattern(
-                                pattern_type="overpriced_listing",
-                                confidence=0.75,
-                                description=f"Overpriced {model_key.replace('_', ' ')}: ${price:,} vs market avg ${mean_price:,.0f} ({premium_pct:.0f}% above market)",
-                                affected_listings=[listing['id']],
-                                actionable_insight=f"Avoid - {premium_pct:.0f}% above market price",
-                                supporting_data={
-                                    'model': model_key.replace('_', ' '),
-                                    'listed_price': price,
-                                    'market_average': mean_price,
-                                    'premium_percentage': premium_pct,
-                                    'z_score': z_score
-                                }
-                            ))
-        
+            elif z_score > 3.5:  # Overpriced
+                premium_pct = ((price - mean_price) / mean_price) * 100
+                patterns.append(MarketPattern(
+                    pattern_type="overpriced_listing",
+                    confidence=0.75,
+                    description=f"Overpriced {model_key.replace('_', ' ')}: ${price:,.0f} vs market avg ${mean_price:,.0f} ({premium_pct:.0f}% above market)",
+                    affected_listings=[listing_id],
+                    actionable_insight=f"Avoid - {premium_pct:.0f}% above market price",
+                    supporting_data={
+                        'model': model_key.replace('_', ' '),
+                        'listed_price': price,
+                        'market_average': mean_price,
+                        'premium_percentage': premium_pct,
+                        'z_score': z_score
+                    }
+                ))
+    
         return patterns
     
-    def _detect_market_timing_opportunities(self, listings: List[Dict]) -> List[MarketPattern]:
+    def _detect_market_timing_opportunities(self, cols: Dict[str, Any]) -> List[MarketPattern]:
         """Detect market timing and investment opportunities"""
         patterns = []
+        if len(cols['id']) < 10:  # Can never have sufficient data below
+            return patterns
         
         # Analyze age vs price depreciation patterns
-        age_price_data = []
         current_year = datetime.now().year
+        aged = np.flatnonzero(np.array([year is not None for year in cols['year']], dtype=bool) & ~np.isnan(cols['price']))
         
-        for listing in listings:
-            title = listing.get('title', '').lower()
-            price = listing.get('price')
-            
-            year_match = re.search(r'(20\d{2}|19\d{2})', title)
+        if len(aged) >= 10:  # Need sufficient data
+            ages = current_year - np.array([int(cols['year'][i]) for i in aged], dtype=np.int64)
+            rate_ages, avg_prices, rates, aged_groups = _depreciation_rates(ages, cols['price'][aged])
             
-            if year_match and price:
-                year = int(year_match.group(1))
-                age = current_year - year
-                age_price_data.append({'age': age, 'price': price, 'listing': listing})
-        
-        if len(age_price_data) >= 10:  # Need sufficient data
-            # Find sweet spot ages (best value retention)
-            age_groups = defaultdict(list)
-            for item in age_price_data:
-                age_groups[item['age']].append(item['price'])
-            
-            # Calculate price per year depreciation
-            age_avg_prices = {}
-            for age, prices in age_groups.items():
-                if len(prices) >= 2:  # Need multiple data points
-                    age_avg_prices[age] = statistics.mean(prices)
-            
-            if len(age_avg_prices) >= 3:
-                # Find ages with best value (slowest depreciation)
-                depreciation_rates = []
-                for age in sorted(age_avg_prices.keys())[1:]:  # Skip age 0
-                    prev_age = age - 1
-                    if prev_age in age_avg_prices:
-                        depreciation = age_avg_prices[prev_age] - age_avg_prices[age]
-                        depreciation_rate = depreciation / age_avg_prices[prev_age] if age_avg_prices[prev_age] > 0 else 0
-                        depreciation_rates.append({
-                            'age': age,
-                            'depreciation_rate': depreciation_rate,
-                            'avg_price': age_avg_prices[age]
-                        })
-                
+            if aged_groups >= 3:
                 # Find sweet spot (low depreciation rate + reasonable age)
-                if depreciation_rates:
-                    sweet_spot = min([d for d in depreciation_rates if 2 <= d['age'] <= 5], 
-                                   key=lambda x: x['depreciation_rate'], default=None)
+                in_range = np.nonzero((rate_ages >= 2) & (rate_ages <= 5))[0]
+                if len(in_range):
+                    best = in_range[np.argmin(rates[in_range])]
+                    sweet_spot = {
+                        'age': int(rate_ages[best]),
+                        'depreciation_rate': float(rates[best]),
+                        'avg_price': float(avg_prices[best])
+                    }
                     
-                    if sweet_spot:
-                        patterns.append(MarketPattern(
-                            pattern_type="value_sweet_spot",
-                            confidence=0.7,
-                            description=f"Value sweet spot identified: {sweet_spot['age']}-year-old units show lowest depreciation ({sweet_spot['depreciation_rate']:.1%} annually)",
-                            affected_listings=[item['listing']['id'] for item in age_price_data if item['age'] == sweet_spot['age']],
-                            actionable_insight=f"Target {sweet_spot['age']}-year-old models for best value retention",
-                            supporting_data=sweet_spot
-                        ))
+                    patterns.append(MarketPattern(
+                        pattern_type="value_sweet_spot",
+                        confidence=0.7,
+                        description=f"Value sweet spot identified: {sweet_spot['age']}-year-old units show lowest depreciation ({sweet_spot['depreciation_rate']:.1%} annually)",
+                        affected_listings=cols['id'][aged[ages == sweet_spot['age']]].tolist(),
+                        actionable_insight=f"Target {sweet_spot['age']}-year-old models for best value retention",
+                        supporting_data=sweet_spot
+                    ))
         
         return patterns
     
-    def _detect_emerging_trends(self, listings: List[Dict]) -> List[MarketPattern]:
+    def _detect_emerging_trends(self, cols: Dict[str, Any]) -> List[MarketPattern]:
         """Detect emerging market trends and model preferences"""
         patterns = []
+        if len(cols['id']) < 10:  # Can never have 10 recent listings
+            return patterns
         
         # Analyze model popularity trends
         model_mentions = defaultdict(int)
-        recent_listings = []
         
-        cutoff_date = datetime.now() - timedelta(days=90)  # Last 90 days
+        cutoff_date = pd.Timestamp.now(tz='UTC') - timedelta(days=90)  # Last 90 days
+        recent = np.flatnonzero(cols['date'] >= cutoff_date)
+        recent_models = [_trend_models_in(cols['title'][i]) for i in recent]
         
-        for listing in listings:
-            added_date = listing.get('addedDate') or listing.get('first_seen')
-            if added_date:
-                try:
-                    date_obj = datetime.fromisoformat(added_date.replace('Z', '+00:00'))
-                    if date_obj >= cutoff_date:
-                        recent_listings.append(listing)
-                except:
-                    continue
-        
-        # Extract model patterns from recent listings
-        for listing in recent_listings:
-            title = listing.get('title', '').lower()
-            
-            # Count specific model mentions
-            models = ['svho', 'cruiser', 'deluxe', 'wake', 'gtr', 'gtx', 'rxt', 'gti']
-            for model in models:
-                if model in title:
+        # Count specific model mentions in recent listings
+        for mentioned in recent_models:
+            for model in _TREND_MODELS:
+                if model in mentioned:
                     model_mentions[model] += 1
         
         # Identify trending models (high recent activity)
-        total_recent = len(recent_listings)
+        total_recent = len(recent)
         if total_recent >= 10:
             trending_models = []
             for model, count in model_mentions.items():
@@ -531,99 +653,233 @@ class MarketIntelligenceEngine:
             
             if trending_models:
                 top_trend = max(trending_models, key=lambda x: x['popularity_rate'])
+                has_model = np.array([top_trend['model'] in mentioned for mentioned in recent_models], dtype=bool)
                 patterns.append(MarketPattern(
                     pattern_type="trending_model",
                     confidence=0.65,
                     description=f"Trending model: {top_trend['model'].upper()} appears in {top_trend['popularity_rate']:.1%} of recent listings",
-                    affected_listings=[l['id'] for l in recent_listings if top_trend['model'] in l.get('title', '').lower()],
+                    affected_listings=cols['id'][recent[has_model]].tolist(),
                     actionable_insight=f"High market activity in {top_trend['model'].upper()} models - investigate demand drivers",
                     supporting_data=top_trend
                 ))
         
         return patterns
     
+    def _detect_cross_seller_templates(self, cols: Dict[str, Any]) -> List[MarketPattern]:
+        """Detect near-identical descriptions shared by listings from different sellers"""
+        patterns = []
+        if len(cols['id']) < 3:  # No template group can reach the 3-listing minimum
+            return patterns
+        
+        # Identical descriptions collapse to one entry, so only distinct texts are compared
+        positions = defaultdict(list)
+        for i, tokens in enumerate(cols['desc_tokens']):
+            if tokens:
+                positions[tokens].append(i)
+        texts = list(positions)
+        
+        # Link near-duplicate texts across the whole dataset; without an LSH index an
+        # all-pairs comparison would be quadratic, so only identical texts group then
+        links = []
+        if MinHashLSH is not None:
+            links = [(i, j) for i, j in self._lsh_candidates(texts, 0.8)
+                     if self._text_similarity(texts[i], texts[j]) > 0.8]
+        
+        linked = _linked_groups(len(texts), links)
+        grouped = {i for group in linked for i in group}
+        linked += [[i] for i in range(len(texts)) if i not in grouped]
+        
+        for group in linked:
+            members = sorted(p for i in group for p in positions[texts[i]])
+            if len(members) < 3:
+                continue
+            
+            sellers = list(dict.fromkeys(
+                seller for seller in (cols['seller'][i] for i in members) if seller and seller != 'Unknown'))
+            if len(sellers) >= 2:
+                patterns.append(MarketPattern(
+                    pattern_type="cross_seller_template",
+                    confidence=0.65,
+                    description=f"Shared template: {len(members)} listings from {len(sellers)} sellers use near-identical descriptions",
+                    affected_listings=cols['id'][members].tolist(),
+                    actionable_insight="Possible dealer network or reposted inventory - verify sellers before negotiating",
+                    supporting_data={
+                        'sellers': sellers,
+                        'listing_count': len(members)
+                    }
+                ))
+        
+        return patterns
+    
     # Helper methods
-    def _normalize_location(self, location: str) -> str:
-        """Normalize location for comparison"""
+    @staticmethod
+    @lru_cache(maxsize=4096)
+    def _normalize_location(location: str) -> str:
+        """Normalize location for comparison (cached; the same strings repeat across listings)"""
         if not location:
             return ''
         
         # Clean up common location formats
-        location = location.lower().strip()
-        location = re.sub(r'\d+\s*miles?\s*away', '', location)
-        location = location.replace(',', ' ').strip()
+        location = _MILES_RE.sub('', location.lower()).translate(_COMMA_TO_SPACE)
         
         # Extract city/state
         parts = location.split()
         if len(parts) >= 2:
             return f"{parts[0]} {parts[-1]}"  # First word + last word (likely city + state)
         
-        return location
+        return location.strip()
     
-    def _find_similar_models(self, listings: List[Dict]) -> List[str]:
-        """Find similar models within a list of listings"""
-        models = []
-        for listing in listings:
-            title = listing.get('title', '').lower()
-            
-            model_match = re.search(r'(vx|fx|gp|gtr|gtx|gti|rxt|svho|cruiser|deluxe|wake)', title)
-            if model_match:
-                models.append(model_match.group(1))
-        
-        # Count occurrences and return models with multiple instances
-        model_counts = Counter(models)
-        return [model for model, count in model_counts.items() if count >= 2]
+    def _cluster_locations(self, locations: List[str]) -> Dict[str, str]:
+        """Map each location to the first-seen location of its geographic cluster"""
+        cluster_names = {loc: loc for loc in locations}
+        
+        geocodes = self._geocode_locations(locations)
+        located = [loc for loc in locations if geocodes.get(loc)]
+        if len(located) < 2:
+            return cluster_names
+        
+        coords = np.radians(np.array([geocodes[loc] for loc in located], dtype=np.float64))
+        radius = CLUSTER_RADIUS_KM / EARTH_RADIUS_KM
+        if BallTree is not None:
+            neighbors = BallTree(coords, metric='haversine').query_radius(coords, r=radius)
+        else:
+            within = _haversine(coords[:, None, :], coords[None, :, :]) <= radius
+            neighbors = [np.nonzero(row)[0] for row in within]
+        
+        # Each unassigned location seeds a cluster with its unassigned neighbors
+        cluster = np.full(len(located), -1)
+        for i in range(len(located)):
+            if cluster[i] < 0:
+                members = neighbors[i]
+                cluster[members[cluster[members] < 0]] = i
+        
+        for loc, seed in zip(located, cluster):
+            cluster_names[loc] = located[seed]
+        return cluster_names
     
-    def _text_similarity(self, text1: str, text2: str) -> float:
-        """Calculate text similarity between two strings"""
-        if not text1 or not text2:
-            return 0.0
-        
+    def _geocode_locations(self, locations: List[str]) -> Dict[str, Optional[List[float]]]:
+        """Look up (lat, lon) for each location, geocoding only names not yet cached"""
+        geocodes = self._load_cache().setdefault('geocodes', {})
+        missing = [loc for loc in locations if loc not in geocodes]
+        if not missing:
+            return geocodes
+        
+        geolocator = Nominatim(user_agent="marketplace-tracker")
+        for i, location in enumerate(missing):
+            if i:
+                time.sleep(1)  # Nominatim usage policy: one request per second
+            try:
+                place = geolocator.geocode(location, timeout=5)
+            except GeopyError as e:
+                logger.warning(f"Geocoding unavailable, grouping remaining locations by name: {e}")
+                break
+            geocodes[location] = [place.latitude, place.longitude] if place else None
+        
+        self._save_cache()
+        return geocodes
+    
+    def _load_cache(self) -> Dict[str, Any]:
+        """Load the intelligence cache once per engine"""
+        if self._cache_data is None:
+            try:
+                with open(self.intelligence_cache, 'rb') as f:
+                    self._cache_data = json_io.loads(f.read())
+            except (FileNotFoundError, json.JSONDecodeError):
+                self._cache_data = {}
+        return self._cache_data
+    
+    def _save_cache(self):
+        """Persist the intelligence cache"""
+        try:
+            with open(self.intelligence_cache, 'wb') as f:
+                f.write(json_io.dumps(self._cache_data, indent=True))
+        except Exception as e:
+            logger.error(f"Error saving intelligence cache: {e}")
+    
+    def _find_similar_models(self, title_models: List[tuple]) -> List[str]:
+        """Find similar models given the model keywords parsed from each listing title"""
+        # Count each listing's first model by vocabulary slot
+        counts = [0] * len(_MODELS)
+        for found in title_models:
+            if found:
+                counts[_MODEL_INDEX[found[0]]] += 1
+        
+        # Return models with multiple instances
+        return [model for model, count in zip(_MODELS, counts) if count >= 2]
+    
+    @staticmethod
+    def _text_similarity(words1: frozenset, words2: frozenset) -> float:
+        """Calculate text similarity between two pre-tokenized texts"""
         # Simple Jaccard similarity
-        words1 = set(text1.lower().split())
-        words2 = set(text2.lower().split())
-        
-        intersection = words1.intersection(words2)
-        union = words1.union(words2)
-        
-        return len(intersection) / len(union) if union else 0.0
+        union = len(words1 | words2)
+        return len(words1 & words2) / union if union else 0.0
+    
+    def _count_similar_pairs(self, token_sets: List[frozenset], threshold: float) -> int:
+        """Count text pairs whose word-level Jaccard similarity exceeds threshold"""
+        # Empty texts never match anything
+        token_sets = [tokens for tokens in token_sets if tokens]
+        
+        if MinHashLSH is None:
+            return sum(1 for a, b in combinations(token_sets, 2) if self._text_similarity(a, b) > threshold)
+        
+        similar = 0
+        for i, j in self._lsh_candidates(token_sets, threshold):
+            if self._text_similarity(token_sets[i], token_sets[j]) > threshold:
+                similar += 1
+        return similar
+    
+    @staticmethod
+    def _lsh_candidates(token_sets: List[frozenset], threshold: float):
+        """Yield candidate pairs (i < j) of possibly similar token sets from a MinHash LSH index"""
+        # One signature per text; candidates still need an exact check.
+        # Bucketing below the threshold keeps near-threshold pairs from being missed.
+        lsh = MinHashLSH(threshold=threshold * 0.75, num_perm=64)
+        signatures = []
+        for i, tokens in enumerate(token_sets):
+            mh = MinHash(num_perm=64)
+            for token in tokens:
+                mh.update(token.encode('utf8'))
+            lsh.insert(i, mh)
+            signatures.append(mh)
+        
+        for i, mh in enumerate(signatures):
+            for j in lsh.query(mh):
+                if j > i:
+                    yield i, j
     
     def _save_patterns(self, patterns: List[MarketPattern]):
-        """Save detected patterns for historical analysis"""
+        """Append detected patterns to the history log (one JSON object per line)"""
         try:
-            # Load existing patterns
-            try:
-                with open(self.patterns_db, 'r') as f:
-                    historical_patterns = json.load(f)
-            except FileNotFoundError:
-                historical_patterns = []
-            
-            # Add new patterns with timestamp
-            for pattern in patterns:
-                historical_patterns.append({
-                    'timestamp': datetime.now().isoformat(),
-                    'pattern_type': pattern.pattern_type,
-                    'confidence': pattern.confidence,
-                    'description': pattern.description,
-                    'potential_value': pattern.potential_value,
-                    'actionable_insight': pattern.actionable_insight,
-                    'supporting_data': pattern.supporting_data
-                })
-            
-            # Save updated patterns
-            with open(self.patterns_db, 'w') as f:
-                json.dump(historical_patterns, f, indent=2)
+            timestamp = datetime.now().isoformat()
+            with open(self.patterns_db, 'ab') as f:
+                for pattern in patterns:
+                    f.write(json_io.dumps({
+                        'timestamp': timestamp,
+                        'pattern_type': pattern.pattern_type,
+                        'confidence': pattern.confidence,
+                        'description': pattern.description,
+                        'potential_value': pattern.potential_value,
+                        'actionable_insight': pattern.actionable_insight,
+                        'supporting_data': pattern.supporting_data
+                    }) + b'\n')
                 
         except Exception as e:
             logger.error(f"Error saving patterns: {e}")
+    
+    def load_pattern_history(self) -> pd.DataFrame:
+        """Load all previously saved patterns for historical analysis"""
+        try:
+            return pd.read_json(self.patterns_db, lines=True)
+        except FileNotFoundError:
+            return pd.DataFrame()
 
 # Usage example
 if __name__ == "__main__":
     engine = MarketIntelligenceEngine()
     
     # Load sample data (your 181 listings)
-    with open("complete_csv_import_20250828_222849.json", 'r') as f:
-        data = json.load(f)
+    with open("complete_csv_import_20250828_222849.json", 'rb') as f:
+        data = json_io.loads(f.read())
     
     listings = data['data'] if 'data' in data else data
     
@@ -3,101 +3,238 @@
 Migration script to move existing marketplace listings to Supabase
 """
 
-import json
 import asyncio
+import json
+import mmap
 import os
+import re
+import shutil
+import tempfile
 from datetime import datetime
-from supabase import create_client, Client
+from functools import partial
+from itertools import islice
+from multiprocessing import Pool
+import httpx
+import ijson
+import xxhash
+from supabase import create_client, Client, ClientOptions
+from task_pool import limited_gather
+import json_io
+
+try:
+    from tqdm import tqdm
+except ImportError:  # per-batch log lines only
+    tqdm = None
+
+try:
+    import h2  # noqa: F401  (enables HTTP/2 in httpx)
+    HTTP2_AVAILABLE = True
+except ImportError:  # HTTP/1.1 keep-alive only
+    HTTP2_AVAILABLE = False
 
 # Supabase configuration
 SUPABASE_URL = os.getenv('SUPABASE_URL', 'YOUR_SUPABASE_URL')
 SUPABASE_KEY = os.getenv('SUPABASE_KEY', 'YOUR_SUPABASE_ANON_KEY')
 
-def load_existing_data(file_path):
-    """Load existing listings from JSON file"""
+# Rows per insert request; PostgREST takes large bulk inserts in one request
+BATCH_SIZE = int(os.getenv('MIGRATE_BATCH_SIZE', '500'))
+
+# Batches inserted concurrently
+MAX_CONCURRENT_BATCHES = 8
+
+# Seconds per request, matching the Supabase client's own PostgREST default
+POSTGREST_TIMEOUT = 120
+
+# Exports larger than SPLIT_THRESHOLD are split into JSONL shards of about
+# SHARD_BYTES, each migrated by its own worker process
+SHARD_BYTES = 128 * 1024 * 1024
+SPLIT_THRESHOLD = 2 * SHARD_BYTES
+
+# Content fingerprint of each fully migrated export, so unchanged re-runs are skipped
+MIGRATION_STATE_FILE = '.migration_state.json'
+
+_FIRST_TOKEN_RE = re.compile(rb'\S')
+
+def iter_existing_data(file_path):
+    """Stream listings one at a time from a JSON export, without loading the whole file"""
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        
-        # Handle different data formats
-        if isinstance(data, dict) and 'data' in data:
-            return data['data']
-        elif isinstance(data, list):
-            return data
-        else:
-            print(f"Unexpected data format in {file_path}")
-            return []
+        with open(file_path, 'rb') as f:
+            if not os.fstat(f.fileno()).st_size:  # mmap can't map an empty file
+                print(f"Unexpected data format in {file_path}")
+                return
+            
+            # Parse from a read-only memory map of the file rather than through a buffered reader
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                # Handle different data formats: {"data": [...]} or a top-level list
+                first = _FIRST_TOKEN_RE.search(mm)
+                first = first.group() if first else b''
+                
+                if first == b'{':
+                    prefix = 'data.item'
+                elif first == b'[':
+                    prefix = 'item'
+                else:
+                    print(f"Unexpected data format in {file_path}")
+                    return
+                
+                # use_float: prices come back as floats, not Decimals the client can't serialize
+                yield from ijson.items(mm, prefix, use_float=True)
             
     except FileNotFoundError:
         print(f"File not found: {file_path}")
-        return []
-    except json.JSONDecodeError as e:
+    except ijson.JSONError as e:
+        # Listings already yielded are only a prefix of a corrupt export, so fail the caller
         print(f"JSON decode error in {file_path}: {e}")
-        return []
-
-def transform_listing_data(listing):
-    """Transform listing data to match Supabase schema"""
-    return {
-        'title': listing.get('title'),
-        'price': listing.get('price'),
-        'url': listing.get('url'),
-        'location': listing.get('location'),
-        'seller': listing.get('seller'),
-        'photos': listing.get('photos'),
-        'make': listing.get('make'),
-        'model': listing.get('model'),
-        'year': listing.get('year'),
-        'engine_hours': listing.get('engine_hours'),
-        'condition': listing.get('condition'),
-        'description': listing.get('description'),
-        'market_analysis': listing.get('market_analysis'),
-        'status': 'active'
-    }
-
-async def migrate_to_supabase(listings_data):
-    """Migrate listings to Supabase"""
+        raise
+
+def split_export(file_path, shard_dir, shard_bytes=SHARD_BYTES):
+    """Stream an export into JSONL shards of about shard_bytes each, returning their paths"""
+    shard_paths = []
+    shard = None
+    written = 0
+    try:
+        for listing in iter_existing_data(file_path):
+            line = json_io.dumps(listing) + b'\n'
+            if shard is None or (written and written + len(line) > shard_bytes):
+                if shard:
+                    shard.close()
+                shard_paths.append(os.path.join(shard_dir, f"export_part_{len(shard_paths)}.jsonl"))
+                shard = open(shard_paths[-1], 'wb')
+                written = 0
+            shard.write(line)
+            written += len(line)
+    finally:
+        if shard:
+            shard.close()
+    
+    return shard_paths
+
+def iter_shard(shard_path):
+    """Stream listings from a JSONL shard written by split_export"""
+    with open(shard_path, 'rb') as f:
+        for line in f:
+            yield json_io.loads(line)
+
+def migrate_shard(shard_path):
+    """Pool worker: migrate one shard with its own Supabase client and connection pool"""
+    return asyncio.run(migrate_to_supabase(iter_shard(shard_path)))
+
+def load_migration_state():
+    """Load the per-export record of completed migrations"""
+    try:
+        with open(MIGRATION_STATE_FILE, 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def save_migration_state(state):
+    """Save the per-export record of completed migrations"""
+    with open(MIGRATION_STATE_FILE, 'w') as f:
+        json.dump(state, f, indent=2)
+
+# Listing fields copied into the Supabase listings table
+_FIELDS = (
+    'title', 'price', 'url', 'location', 'seller', 'photos', 'make', 'model', 'year',
+    'engine_hours', 'condition', 'description', 'market_analysis'
+)
+
+def _compile_transform(fields):
+    """Generate transform_listing_data for a fixed field list, as one dict display with constant keys"""
+    items = ', '.join(f"{field!r}: get({field!r})" for field in fields)
+    source = (
+        "def transform_listing_data(listing):\n"
+        "    get = listing.get\n"
+        f"    return {{{items}, 'status': 'active'}}\n"
+    )
+    namespace = {'__name__': __name__}
+    exec(source, namespace)
+    return namespace['transform_listing_data']
+
+# Specialized once at import, since the Supabase schema never changes at runtime
+transform_listing_data = _compile_transform(_FIELDS)
+transform_listing_data.__doc__ = "Transform listing data to match Supabase schema"
+
+async def migrate_to_supabase(listings_data, total=None):
+    """Migrate listings to Supabase, with a progress bar when the total is known"""
     if not SUPABASE_URL or SUPABASE_URL == 'YOUR_SUPABASE_URL':
         print("❌ Please set SUPABASE_URL and SUPABASE_KEY environment variables")
         print("   Or update the script with your actual Supabase credentials")
         return False
     
+    http_client = None
     try:
+        # One keep-alive connection pool (HTTP/2 where offered) shared by every batch request
+        http_client = httpx.Client(
+            http2=HTTP2_AVAILABLE,
+            limits=httpx.Limits(max_keepalive_connections=16, max_connections=32, keepalive_expiry=60),
+            timeout=POSTGREST_TIMEOUT
+        )
+        
         # Initialize Supabase client
-        supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+        supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY, options=ClientOptions(httpx_client=http_client))
         
-        print(f"🔄 Migrating {len(listings_data)} listings to Supabase...")
+        print("🔄 Migrating listings to Supabase...")
         
-        # Process listings in batches
-        batch_size = 50
+        # Process listings in batches, pulling only one batch from the stream at a time
         total_processed = 0
         total_errors = 0
         
-        for i in range(0, len(listings_data), batch_size):
-            batch = listings_data[i:i + batch_size]
-            transformed_batch = [transform_listing_data(listing) for listing in batch]
+        progress = tqdm(total=total, unit='listing') if tqdm and total else None
+        log = progress.write if progress else print
+        
+        async def insert_batch(batch_num, transformed_batch):
+            nonlocal total_processed, total_errors
             
             try:
-                # Insert batch into Supabase
-                result = supabase.table('listings').insert(transformed_batch).execute()
+                # Insert batch into Supabase (the client is sync, so run it off the event loop).
+                # 'minimal' skips echoing the inserted rows back; a failed insert raises.
+                await asyncio.to_thread(
+                    supabase.table('listings').insert(transformed_batch, returning='minimal').execute
+                )
                 
-                processed = len(result.data) if result.data else 0
+                processed = len(transformed_batch)
                 total_processed += processed
                 
-                print(f"✅ Processed batch {i//batch_size + 1}: {processed} listings")
+                if progress:
+                    progress.update(processed)
+                else:
+                    print(f"✅ Processed batch {batch_num}: {processed} listings")
                 
             except Exception as e:
-                print(f"❌ Error processing batch {i//batch_size + 1}: {e}")
-                total_errors += len(batch)
+                log(f"❌ Error processing batch {batch_num}: {e}")
+                total_errors += len(transformed_batch)
+                if progress:
+                    progress.update(len(transformed_batch))
+        
+        def batch_inserts():
+            listings = iter(listings_data)
+            batch_num = 0
+            while batch := [transform_listing_data(listing) for listing in islice(listings, BATCH_SIZE)]:
+                batch_num += 1
+                yield partial(insert_batch, batch_num, batch)
+        
+        # Overlap request round trips, but cap in-flight batches so the stream
+        # isn't read ahead faster than the server accepts it
+        try:
+            await limited_gather(batch_inserts(), MAX_CONCURRENT_BATCHES)
+        finally:
+            if progress:
+                progress.close()
         
         print(f"\n🎉 Migration completed!")
         print(f"   ✅ Successfully migrated: {total_processed} listings")
         print(f"   ❌ Errors: {total_errors} listings")
         
-        return True
+        # Failed batches mean the export still needs another run
+        return not total_errors
         
     except Exception as e:
         print(f"❌ Migration failed: {e}")
         return False
+    
+    finally:
+        if http_client:
+            http_client.close()
 
 def main():
     """Main migration function"""
@@ -127,14 +264,32 @@ def main():
     
     print(f"📁 Found data file: {data_file}")
     
-    # Load existing data
-    listings_data = load_existing_data(data_file)
+    # Count listings in a streaming pass (the migration streams the file again), folding
+    # each row into an order-independent XOR fingerprint of the export's content
+    listing_count = 0
+    content_fp = 0
+    try:
+        for listing in iter_existing_data(data_file):
+            listing_count += 1
+            content_fp ^= xxhash.xxh3_64_intdigest(f"{listing.get('url')}|{listing.get('price')}".encode())
+    except ijson.JSONError:
+        print("❌ Data file is truncated or corrupt; nothing was migrated")
+        return
     
-    if not listings_data:
+    if not listing_count:
         print("❌ No listings found in data file")
         return
     
-    print(f"📊 Found {len(listings_data)} listings to migrate")
+    # The count guards against XOR cancelling out repeated rows
+    state_key = os.path.abspath(data_file)
+    fingerprint = {'fingerprint': f"{content_fp:016x}", 'listings': listing_count}
+    migration_state = load_migration_state()
+    previous = migration_state.get(state_key, {})
+    if all(previous.get(key) == value for key, value in fingerprint.items()):
+        print("✅ Already migrated; skipping.")
+        return
+    
+    print(f"📊 Found {listing_count} listings to migrate")
     
     # Confirm migration
     response = input("\n🤔 Proceed with migration? (y/N): ").strip().lower()
@@ -143,9 +298,23 @@ def main():
         return
     
     # Run migration
-    success = asyncio.run(migrate_to_supabase(listings_data))
+    if os.path.getsize(data_file) > SPLIT_THRESHOLD:
+        shard_dir = tempfile.mkdtemp(prefix='migration_shards_')
+        try:
+            shard_paths = split_export(data_file, shard_dir)
+            print(f"✂️  Split export into {len(shard_paths)} shards")
+            
+            with Pool(min(len(shard_paths), os.cpu_count() or 1)) as pool:
+                success = all(pool.map(migrate_shard, shard_paths))
+        finally:
+            shutil.rmtree(shard_dir, ignore_errors=True)
+    else:
+        success = asyncio.run(migrate_to_supabase(iter_existing_data(data_file), total=listing_count))
     
     if success:
+        migration_state[state_key] = {**fingerprint, 'migrated_at': datetime.now().isoformat()}
+        save_migration_state(migration_state)
+        
         print("\n🎯 Next steps:")
         print("   1. Update your Supabase credentials in js/supabase-client.js")
         print("   2. Open unified-marketplace-tracker.html")
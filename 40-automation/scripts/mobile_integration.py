@@ -4,15 +4,63 @@ Mobile Integration Strategy for Marketplace Tracker
 Handles URL sharing from mobile → automatic processing → Supabase sync
 """
 
-import json
 import os
-import hashlib
+import re
+import sqlite3
+from urllib.parse import urlsplit
+from contextlib import contextmanager
 from datetime import datetime
+from difflib import SequenceMatcher
+from functools import lru_cache, partial
 import asyncio
 import logging
+import time
+import xxhash
+from task_pool import limited_gather
+import json_io
+
+try:
+    from datasketch import MinHash, MinHashLSH
+except ImportError:  # bucketed SequenceMatcher fallback
+    MinHash = MinHashLSH = None
 
 logger = logging.getLogger(__name__)
 
+_FB_PREFIX_RE = re.compile(r'\(\d+\)\s*Marketplace\s*-\s*')
+_FB_SUFFIX_RE = re.compile(r'\|\s*Facebook$')
+_FB_ITEM_RE = re.compile(r'/marketplace/item/(\d+)')
+
+# Similar-listing candidates share a (make, model, year) bucket
+_MAKES = ('yamaha', 'sea-doo', 'seadoo', 'kawasaki', 'honda', 'polaris')
+_YEAR_RE = re.compile(r'\b(?:19|20)\d{2}\b')
+_MODEL_RE = re.compile(r'\b(?:vx|fx|gp|gtr|gtx|gti|rxt|svho|cruiser|deluxe|wake|pro|spark|superjet|waverunner|jetski)\b')
+
+# Queue URLs processed at once, and how often queue state is saved while they run
+MAX_CONCURRENT_URLS = 8
+QUEUE_SAVE_EVERY = 10
+QUEUE_SAVE_INTERVAL = 5.0
+
+# Leading bytes of the whitespace-normalized description hashed into the fingerprint
+_DESC_PREFIX = 4096
+
+# Leading characters of normalized title + description compared for similarity
+_CONTENT_PREFIX = 4096
+
+# Near-duplicate search over character shingles of that content
+_SHINGLE_SIZE = 5
+_LSH_THRESHOLD = 0.85
+_LSH_NUM_PERM = 128
+
+def _shingles(content):
+    """Set of overlapping character n-grams (the whole string if shorter)"""
+    return {content[i:i + _SHINGLE_SIZE] for i in range(max(len(content) - _SHINGLE_SIZE + 1, 1))}
+
+def _minhash(shingles):
+    """MinHash signature of a shingle set"""
+    mh = MinHash(num_perm=_LSH_NUM_PERM)
+    mh.update_batch([shingle.encode() for shingle in shingles])
+    return mh
+
 class MobileIntegrationHandler:
     """
     Handles the mobile-to-tracker workflow:
@@ -25,8 +73,24 @@ class MobileIntegrationHandler:
     
     def __init__(self, supabase_client=None):
         self.supabase = supabase_client
-        self.processing_queue = "mobile_queue.json"
-        self.duplicate_cache = "duplicate_cache.json"
+        self.processing_queue = "mobile_queue.jsonl"
+        self.legacy_processing_queue = "mobile_queue.json"
+        self.duplicate_cache = "duplicate_cache.sqlite"
+        
+        # Earlier JSON cache, imported once into an empty database
+        self.legacy_duplicate_cache = "duplicate_cache.json"
+        
+        # Autocommit; queue runs open their own transaction
+        self.conn = sqlite3.connect(self.duplicate_cache, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        
+        self._create_schema()
+        self._import_legacy_cache()
+        self._import_legacy_queue()
+        
+        # MinHash LSH index over cached content, built on the first similarity lookup
+        self._lsh = None
         
     def generate_listing_fingerprint(self, title, price=None, description=None, images=None):
         """
@@ -36,21 +100,27 @@ class MobileIntegrationHandler:
         fingerprint_data = {
             'title_normalized': self.normalize_title(title),
             'price': price,
-            'description_hash': hashlib.md5(description.encode()).hexdigest() if description else None,
+            'description_hash': self.description_hash(description) if description else None,
             'image_count': len(images) if images else 0
         }
         
         # Create composite fingerprint
         fingerprint_string = f"{fingerprint_data['title_normalized']}_{fingerprint_data['price']}_{fingerprint_data['description_hash']}"
-        return hashlib.md5(fingerprint_string.encode()).hexdigest()[:16]
+        return xxhash.xxh3_64_hexdigest(fingerprint_string.encode())
+    
+    def description_hash(self, description):
+        """
+        Hash of the first 4 KB of the whitespace-normalized description, plus its length
+        Whitespace-only differences (CRLF vs LF) hash the same; the length catches most
+        edits past the hashed prefix
+        """
+        normalized = ' '.join(description.split())
+        return f"{xxhash.xxh3_64_hexdigest(normalized.encode()[:_DESC_PREFIX])}:{len(normalized)}"
     
     def normalize_title(self, title):
         """Normalize title for comparison (remove year variations, etc.)"""
-        import re
-        
-        # Remove Facebook marketplace prefix
-        title = re.sub(r'\(\d+\)\s*Marketplace\s*-\s*', '', title)
-        title = re.sub(r'\|\s*Facebook$', '', title)
+        # Remove Facebook marketplace prefix and suffix
+        title = _FB_SUFFIX_RE.sub('', _FB_PREFIX_RE.sub('', title))
         
         # Normalize whitespace and case
         title = ' '.join(title.lower().split())
@@ -61,8 +131,6 @@ class MobileIntegrationHandler:
     
     def add_to_mobile_queue(self, url, source="mobile"):
         """Add URL to processing queue"""
-        queue_data = self.load_queue()
-        
         new_item = {
             'id': datetime.now().timestamp(),
             'url': url,
@@ -72,14 +140,13 @@ class MobileIntegrationHandler:
             'processing_attempts': 0
         }
         
-        queue_data.append(new_item)
-        self.save_queue(queue_data)
+        self.append_queue_records([new_item])
         
         logger.info(f"📱 Added to mobile queue: {url}")
         return new_item['id']
     
     async def process_mobile_queue(self):
-        """Process all items in mobile queue"""
+        """Process all items in mobile queue, several URLs at a time"""
         queue_data = self.load_queue()
         pending_items = [item for item in queue_data if item['status'] == 'pending']
         
@@ -92,64 +159,181 @@ class MobileIntegrationHandler:
         # Import enhanced collector
         from enhanced_screenshot_collector import EnhancedScreenshotCollector
         
-        # Process each item
-        for item in pending_items:
-            try:
-                # Mark as processing
-                item['status'] = 'processing'
-                item['processing_attempts'] += 1
-                self.save_queue(queue_data)
-                
-                # Process the single URL
-                result = await self.process_single_url(item['url'])
-                
-                if result:
-                    # Check for duplicates
-                    fingerprint = self.generate_listing_fingerprint(
-                        result.get('title', ''),
-                        result.get('price'),
-                        result.get('description'),
-                        result.get('images')
-                    )
-                    
-                    duplicate_info = self.check_duplicate(fingerprint, result)
-                    
-                    if duplicate_info['is_duplicate']:
-                        logger.info(f"🔄 Duplicate detected: {duplicate_info['action']}")
-                        item['status'] = 'duplicate'
-                        item['duplicate_action'] = duplicate_info['action']
-                        item['original_listing'] = duplicate_info['original_id']
-                    else:
-                        # Add to tracker and sync to Supabase
-                        await self.add_to_tracker(result)
-                        item['status'] = 'completed'
-                        item['listing_id'] = result.get('listing_id')
-                    
-                    item['fingerprint'] = fingerprint
-                    
-                else:
-                    item['status'] = 'failed'
-                    
+        unsaved = []
+        last_save = time.monotonic()
+        
+        def finished(item):
+            nonlocal last_save
+            # Append finished items to the queue log in batches
+            unsaved.append(item)
+            if len(unsaved) >= QUEUE_SAVE_EVERY or time.monotonic() - last_save >= QUEUE_SAVE_INTERVAL:
+                self.append_queue_records(unsaved)
+                unsaved.clear()
+                last_save = time.monotonic()
+        
+        # Re-shared URLs of already cached listings skip extraction entirely
+        known_urls = self.prefetch_url_fingerprints(self.url_fingerprint(item['url']) for item in pending_items)
+        
+        # Extract every URL first, so the duplicate cache is queried once for the whole run
+        extracted = []
+        
+        async def extract(item):
+            original_id = known_urls.get(self.url_fingerprint(item['url']), False)
+            if original_id is not False:
+                logger.info(f"🔄 Already tracked URL: {item['url']}")
+                item['status'] = 'duplicate'
+                item['duplicate_action'] = 'skip_known_url'
+                item['original_listing'] = original_id
                 item['processed_date'] = datetime.now().isoformat()
-                self.save_queue(queue_data)
-                
-            except Exception as e:
-                logger.error(f"❌ Mobile processing failed for {item['url']}: {e}")
-                item['status'] = 'failed'
-                item['error'] = str(e)
-                self.save_queue(queue_data)
+                finished(item)
+                return
+            
+            result = await self._extract_queue_item(item)
+            if result:
+                extracted.append((item, result))
+            else:
+                finished(item)
+        
+        await limited_gather((partial(extract, item) for item in pending_items), MAX_CONCURRENT_URLS)
+        
+        fingerprints = [
+            self.generate_listing_fingerprint(
+                result.get('title', ''),
+                result.get('price'),
+                result.get('description'),
+                result.get('images')
+            )
+            for _, result in extracted
+        ]
+        known = self.prefetch_fingerprints(fingerprints)
+        
+        async def resolve(item, result, fingerprint):
+            await self._resolve_queue_item(item, result, fingerprint, known)
+            finished(item)
+        
+        # One transaction for all duplicate cache writes in this run
+        with self._transaction():
+            await limited_gather(
+                (partial(resolve, item, result, fingerprint) for (item, result), fingerprint in zip(extracted, fingerprints)),
+                MAX_CONCURRENT_URLS
+            )
+        
+        if unsaved:
+            self.append_queue_records(unsaved)
+        
+        # Compact the log to one line per item, from a fresh replay so items queued during the run are kept
+        self.save_queue(self.load_queue())
+    
+    async def _extract_queue_item(self, item):
+        """Extract one queue item's listing, None (with the item marked failed) if that fails"""
+        try:
+            # Mark as processing
+            item['status'] = 'processing'
+            item['processing_attempts'] += 1
+            
+            # Process the single URL
+            result = await self.process_single_url(item['url'])
+            
+        except Exception as e:
+            logger.error(f"❌ Mobile processing failed for {item['url']}: {e}")
+            item['status'] = 'failed'
+            item['error'] = str(e)
+            return None
+        
+        if not result:
+            item['status'] = 'failed'
+            item['processed_date'] = datetime.now().isoformat()
+        return result
+    
+    async def _resolve_queue_item(self, item, result, fingerprint, known):
+        """Check an extracted listing for duplicates and add it to the tracker if new"""
+        try:
+            result.setdefault('url', item['url'])
+            duplicate_info = self.check_duplicate(fingerprint, result, known)
+            
+            if duplicate_info['is_duplicate']:
+                logger.info(f"🔄 Duplicate detected: {duplicate_info['action']}")
+                item['status'] = 'duplicate'
+                item['duplicate_action'] = duplicate_info['action']
+                item['original_listing'] = duplicate_info.get('original_id')
+                if 'similar_listings' in duplicate_info:
+                    item['similar_listings'] = [match['listing_id'] for match in duplicate_info['similar_listings']]
+            else:
+                # Add to tracker and sync to Supabase
+                await self.add_to_tracker(result)
+                item['status'] = 'completed'
+                item['listing_id'] = result.get('listing_id')
+            
+            item['fingerprint'] = fingerprint
+            item['processed_date'] = datetime.now().isoformat()
+            
+        except Exception as e:
+            logger.error(f"❌ Mobile processing failed for {item['url']}: {e}")
+            item['status'] = 'failed'
+            item['error'] = str(e)
+    
+    def prefetch_fingerprints(self, fingerprints):
+        """Cached entries for many fingerprints at once, keyed by fingerprint"""
+        known = {}
+        unique = list(set(fingerprints))
+        
+        # Chunked to stay under SQLite's bound-parameter limit
+        for i in range(0, len(unique), 500):
+            chunk = unique[i:i + 500]
+            rows = self.conn.execute(
+                f"SELECT fingerprint, listing_id, title, price FROM fp WHERE fingerprint IN ({','.join('?' * len(chunk))})",
+                chunk
+            )
+            known.update((row['fingerprint'], dict(row)) for row in rows)
+        
+        return known
+    
+    def prefetch_url_fingerprints(self, url_fingerprints):
+        """Listing ids of cached listings for many URL fingerprints, keyed by URL fingerprint"""
+        known = {}
+        unique = list(set(filter(None, url_fingerprints)))
+        
+        for i in range(0, len(unique), 500):
+            chunk = unique[i:i + 500]
+            rows = self.conn.execute(
+                f"SELECT url_fp, listing_id FROM fp WHERE url_fp IN ({','.join('?' * len(chunk))})",
+                chunk
+            )
+            known.update((row['url_fp'], row['listing_id']) for row in rows)
+        
+        return known
     
-    def check_duplicate(self, fingerprint, new_data):
+    @staticmethod
+    def url_fingerprint(url):
+        """
+        Canonical identity of a listing URL: the Marketplace item id when present,
+        otherwise the URL without query string or fragment
+        """
+        if not url:
+            return None
+        
+        item_match = _FB_ITEM_RE.search(url)
+        if item_match:
+            return f"fb:{item_match.group(1)}"
+        
+        parts = urlsplit(url)
+        return f"{parts.netloc.lower()}{parts.path.rstrip('/')}"
+    
+    def check_duplicate(self, fingerprint, new_data, known=None):
         """
         Advanced duplicate detection with change tracking
+        known: entries from prefetch_fingerprints (kept up to date with new additions);
+        without it the cache is queried directly
         Returns: {'is_duplicate': bool, 'action': str, 'original_id': str}
         """
-        cache = self.load_duplicate_cache()
+        if known is None:
+            row = self.conn.execute("SELECT * FROM fp WHERE fingerprint = ?", (fingerprint,)).fetchone()
+            original = dict(row) if row else None
+        else:
+            original = known.get(fingerprint)
         
         # Check exact fingerprint match
-        if fingerprint in cache:
-            original = cache[fingerprint]
-            
+        if original:
             # Compare for changes
             changes = self.detect_changes(original, new_data)
             
@@ -168,7 +352,7 @@ class MobileIntegrationHandler:
                 }
         
         # Check for similar listings (same make/model but different details)
-        similar_matches = self.find_similar_listings(new_data, cache)
+        similar_matches = self.find_similar_listings(new_data)
         
         if similar_matches:
             # Manual review needed
@@ -179,15 +363,21 @@ class MobileIntegrationHandler:
             }
         
         # Not a duplicate - add to cache
-        cache[fingerprint] = {
-            'listing_id': new_data.get('listing_id'),
-            'title': new_data.get('title'),
-            'price': new_data.get('price'),
-            'first_seen': datetime.now().isoformat(),
-            'last_updated': datetime.now().isoformat()
-        }
+        title = new_data.get('title') or ''
+        content = self.similarity_content(title, new_data.get('description'))
+        now = datetime.now().isoformat()
+        self.conn.execute('''
+            INSERT OR REPLACE INTO fp
+            (fingerprint, listing_id, title, price, url_fp, bucket, content, content_fp, first_seen, last_updated)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (fingerprint, new_data.get('listing_id'), title, new_data.get('price'), self.url_fingerprint(new_data.get('url')),
+              self.listing_bucket(title), content, xxhash.xxh3_64_hexdigest(content.encode()), now, now))
         
-        self.save_duplicate_cache(cache)
+        if self._lsh is not None:
+            self._lsh.insert(fingerprint, _minhash(_shingles(content)))
+        if known is not None:
+            known[fingerprint] = {'fingerprint': fingerprint, 'listing_id': new_data.get('listing_id'),
+                                  'title': title, 'price': new_data.get('price')}
         
         return {'is_duplicate': False, 'action': 'add_new'}
     
@@ -206,36 +396,221 @@ class MobileIntegrationHandler:
         # Add more change detection logic here
         return changes
     
-    def find_similar_listings(self, new_data, cache):
-        """Find potentially similar listings for manual review"""
-        # Implement fuzzy matching logic
-        return []
+    def find_similar_listings(self, new_data):
+        """
+        Find potentially similar listings for manual review
+        Identical content fingerprints match outright; otherwise candidates come from
+        a MinHash LSH index, or from the listing's (make, model, year) bucket without datasketch
+        """
+        title = new_data.get('title') or ''
+        content = self.similarity_content(title, new_data.get('description'))
+        content_fp = xxhash.xxh3_64_hexdigest(content.encode())
+        
+        if MinHashLSH is not None:
+            return self._find_similar_by_minhash(content, content_fp)
+        
+        bucket = self.listing_bucket(title)
+        if not bucket:
+            return []
+        return self._find_similar_in_bucket(bucket, content, content_fp)
+    
+    def _find_similar_by_minhash(self, content, content_fp):
+        """Cached listings whose shingle sets reach the LSH threshold (exact Jaccard)"""
+        shingles = _shingles(content)
+        keys = self._similarity_index().query(_minhash(shingles))
+        if not keys:
+            return []
+        
+        # LSH candidates can be false positives, so confirm each one exactly
+        similar = []
+        rows = self.conn.execute(
+            f"SELECT listing_id, title, content, content_fp FROM fp WHERE fingerprint IN ({','.join('?' * len(keys))})",
+            keys
+        )
+        for row in rows:
+            if row['content_fp'] == content_fp:
+                similarity = 1.0
+            else:
+                other = _shingles(row['content'] or '')
+                similarity = len(shingles & other) / len(shingles | other)
+                if similarity < _LSH_THRESHOLD:
+                    continue
+            
+            similar.append({
+                'listing_id': row['listing_id'],
+                'title': row['title'],
+                'similarity': similarity
+            })
+        
+        return similar
+    
+    def _similarity_index(self):
+        """MinHash LSH index over the cached listings, built from the cache on first use"""
+        if self._lsh is None:
+            self._lsh = MinHashLSH(threshold=_LSH_THRESHOLD, num_perm=_LSH_NUM_PERM)
+            for row in self.conn.execute("SELECT fingerprint, content FROM fp").fetchall():
+                self._lsh.insert(row['fingerprint'], _minhash(_shingles(row['content'] or '')))
+        return self._lsh
+    
+    def _find_similar_in_bucket(self, bucket, content, content_fp, threshold=0.9):
+        """Cached listings in the same bucket with a SequenceMatcher ratio above threshold"""
+        # The new listing is seq2, which SequenceMatcher preprocesses once for all candidates
+        matcher = SequenceMatcher(None, autojunk=False)
+        matcher.set_seq2(content)
+        
+        similar = []
+        rows = self.conn.execute(
+            "SELECT listing_id, title, content, content_fp FROM fp WHERE bucket = ?", (bucket,)
+        )
+        for row in rows:
+            if row['content_fp'] == content_fp:
+                similarity = 1.0
+            else:
+                matcher.set_seq1(row['content'] or '')
+                # Cheap upper bounds first; ratio() is quadratic in the worst case
+                if matcher.real_quick_ratio() <= threshold or matcher.quick_ratio() <= threshold:
+                    continue
+                similarity = matcher.ratio()
+                if similarity <= threshold:
+                    continue
+            
+            similar.append({
+                'listing_id': row['listing_id'],
+                'title': row['title'],
+                'similarity': similarity
+            })
+        
+        return similar
+    
+    @staticmethod
+    @lru_cache(maxsize=4096)
+    def listing_bucket(title):
+        """(make, model, year) bucket key from a title, None if neither make nor model is found"""
+        title_lower = title.lower()
+        
+        make = next((m for m in _MAKES if m in title_lower), '')
+        model_match = _MODEL_RE.search(title_lower)
+        model = model_match.group() if model_match else ''
+        if not (make or model):
+            return None
+        
+        year_match = _YEAR_RE.search(title_lower)
+        year = year_match.group() if year_match else ''
+        return f"{make}|{model}|{year}"
+    
+    def similarity_content(self, title, description):
+        """Normalized title + description prefix compared by find_similar_listings"""
+        text = f"{self.normalize_title(title)} {' '.join((description or '').lower().split())}"
+        return text[:_CONTENT_PREFIX]
     
     def load_queue(self):
-        """Load mobile processing queue"""
+        """Load mobile processing queue by replaying the JSONL log (later records win)"""
+        items = {}
         try:
-            with open(self.processing_queue, 'r') as f:
-                return json.load(f)
+            with open(self.processing_queue, 'rb') as f:
+                for line in f:
+                    if line.strip():
+                        record = json_io.loads(line)
+                        items.setdefault(record['id'], {}).update(record)
         except FileNotFoundError:
-            return []
+            pass
+        return list(items.values())
+    
+    def append_queue_records(self, records):
+        """Append new or updated queue items to the JSONL log"""
+        with open(self.processing_queue, 'ab') as f:
+            f.writelines(json_io.dumps(record) + b'\n' for record in records)
     
     def save_queue(self, queue_data):
-        """Save mobile processing queue"""
-        with open(self.processing_queue, 'w') as f:
-            json.dump(queue_data, f, indent=2)
+        """Rewrite the queue log with one line per item, dropping superseded records"""
+        tmp_path = f"{self.processing_queue}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.writelines(json_io.dumps(item) + b'\n' for item in queue_data)
+        os.replace(tmp_path, self.processing_queue)
+    
+    def _import_legacy_queue(self):
+        """One-time conversion of the JSON queue file into the JSONL log"""
+        if os.path.exists(self.processing_queue) or not os.path.exists(self.legacy_processing_queue):
+            return
+        
+        with open(self.legacy_processing_queue, 'rb') as f:
+            self.save_queue(json_io.loads(f.read()))
+        
+        logger.info(f"Converted {self.legacy_processing_queue} into {self.processing_queue}")
     
-    def load_duplicate_cache(self):
-        """Load duplicate detection cache"""
+    def _create_schema(self):
+        """Create the duplicate cache table, keyed by fingerprint"""
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS fp (
+                fingerprint TEXT PRIMARY KEY,
+                listing_id TEXT,
+                title TEXT,
+                price REAL,
+                url_fp TEXT,
+                bucket TEXT,
+                content TEXT,
+                content_fp TEXT,
+                first_seen TEXT,
+                last_updated TEXT
+            )
+        ''')
+        
+        # Caches created before URL fingerprints were stored gain the column in place
+        columns = {row['name'] for row in self.conn.execute("PRAGMA table_info(fp)")}
+        if 'url_fp' not in columns:
+            self.conn.execute("ALTER TABLE fp ADD COLUMN url_fp TEXT")
+        
+        # Re-shared URLs are looked up by URL fingerprint, similar-listing candidates by bucket
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_fp_url_fp ON fp (url_fp)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_fp_bucket ON fp (bucket)")
+    
+    def _import_legacy_cache(self):
+        """One-time import of the JSON duplicate cache into an empty database"""
+        if self.conn.execute("SELECT 1 FROM fp LIMIT 1").fetchone():
+            return
+        
         try:
-            with open(self.duplicate_cache, 'r') as f:
-                return json.load(f)
+            with open(self.legacy_duplicate_cache, 'rb') as f:
+                cache = json_io.loads(f.read())
         except FileNotFoundError:
-            return {}
+            return
+        
+        rows = []
+        for fingerprint, entry in cache.items():
+            # The JSON cache never kept descriptions, so similarity uses the title alone
+            title = entry.get('title') or ''
+            content = self.similarity_content(title, None)
+            rows.append((fingerprint, entry.get('listing_id'), title, entry.get('price'),
+                         self.listing_bucket(title), content, xxhash.xxh3_64_hexdigest(content.encode()),
+                         entry.get('first_seen'), entry.get('last_updated')))
+        
+        with self._transaction():
+            self.conn.executemany('''
+                INSERT OR REPLACE INTO fp
+                (fingerprint, listing_id, title, price, bucket, content, content_fp, first_seen, last_updated)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', rows)
+        
+        logger.info(f"Imported {len(cache)} entries from {self.legacy_duplicate_cache} into {self.duplicate_cache}")
+    
+    @contextmanager
+    def _transaction(self):
+        """Group writes into one transaction (no-op if one is already open)"""
+        if self.conn.in_transaction:
+            yield
+            return
+        
+        self.conn.execute('BEGIN')
+        try:
+            yield
+        except Exception:
+            self.conn.execute('ROLLBACK')
+            raise
+        self.conn.execute('COMMIT')
     
-    def save_duplicate_cache(self, cache_data):
-        """Save duplicate detection cache"""
-        with open(self.duplicate_cache, 'w') as f:
-            json.dump(cache_data, f, indent=2)
+    def close(self):
+        """Close the duplicate cache connection"""
+        self.conn.close()
     
     async def process_single_url(self, url):
         """Process a single URL with enhanced extraction"""
@@ -4,15 +4,49 @@ Mobile Integration Server
 Handles URL submissions from phone and queues them for processing
 """
 
-import json
+import gzip
+import hashlib
+import itertools
 import os
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from flask import Flask, request, jsonify, render_template_string
-import threading
+from aiohttp import web
 import asyncio
 import subprocess
+import json_io
 
-app = Flask(__name__)
+try:
+    import redis.asyncio as redis
+except ImportError:
+    redis = None
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+app = web.Application()
+
+def json_response(data, status=200):
+    """JSON response serialized straight to bytes"""
+    return web.Response(body=json_io.dumps(data), status=status, content_type='application/json')
+
+# Queue backend: Redis, or the JSON file for local development (MOBILE_QUEUE_BACKEND=file)
+QUEUE_BACKEND = os.environ.get('MOBILE_QUEUE_BACKEND', 'redis')
+REDIS_URL = os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
+
+# Processing triggers run on a fixed pool of worker threads
+EXECUTOR_MAX_WORKERS = int(os.environ.get('EXECUTOR_MAX_WORKERS', 4))
+
+# Submissions are coalesced: processing starts once PROCESSING_MIN_BATCH URLs are
+# waiting, or PROCESSING_DEBOUNCE seconds after the first one, whichever is sooner
+PROCESSING_DEBOUNCE = 2.0
+PROCESSING_MIN_BATCH = 5
+
+# Every open landing page polls the queue status, so one computation is shared for a few seconds
+STATUS_CACHE_TTL = 2.0
 
 # Mobile landing page HTML
 MOBILE_LANDING_PAGE = """
@@ -248,31 +282,63 @@ MOBILE_LANDING_PAGE = """
 </html>
 """
 
+# The page never changes at runtime, so it is encoded, compressed and tagged once
+LANDING_PAGE_BYTES = MOBILE_LANDING_PAGE.encode('utf-8')
+LANDING_PAGE_GZ = gzip.compress(LANDING_PAGE_BYTES, compresslevel=9, mtime=0)
+LANDING_ETAG = '"' + hashlib.sha256(LANDING_PAGE_BYTES).hexdigest() + '"'
+LANDING_GZ_ETAG = '"' + hashlib.sha256(LANDING_PAGE_GZ).hexdigest() + '"'
+LANDING_CACHE_CONTROL = 'public, max-age=3600, must-revalidate'
+
+def etag_matches(request, etag):
+    """Whether the request's If-None-Match header covers this ETag"""
+    header = request.headers.get('If-None-Match', '')
+    return header == '*' or etag in (tag.strip() for tag in header.split(','))
+
 class MobileQueue:
+    """Queue kept in an append-only JSONL file, for local development without Redis"""
     def __init__(self):
-        self.queue_file = 'mobile_processing_queue.json'
+        self.queue_file = 'mobile_processing_queue.jsonl'
+        self.legacy_queue_file = 'mobile_processing_queue.json'
+        self._import_legacy_queue()
+        
+        # The log is read once; afterwards the in-memory copy is authoritative
+        self.items = {item['id']: item for item in self.load_queue()}
+        self.urls = {item['url'] for item in self.items.values() if item['status'] != 'failed'}
+        self.counts = Counter(item['status'] for item in self.items.values())
+        self.recent = deque(self.items.values(), maxlen=5)
+        self._ids = itertools.count(max(self.items, default=0) + 1)
+        self._log = open(self.queue_file, 'ab', buffering=0)
         
     def load_queue(self):
+        """Replay the JSONL log (later records for an id win)"""
+        items = {}
         try:
-            with open(self.queue_file, 'r') as f:
-                return json.load(f)
+            with open(self.queue_file, 'rb') as f:
+                for line in f.read().split(b'\n'):
+                    if line.strip():
+                        record = json_io.loads(line)
+                        items.setdefault(record['id'], {}).update(record)
         except FileNotFoundError:
-            return []
+            pass
+        return list(items.values())
     
-    def save_queue(self, queue_data):
-        with open(self.queue_file, 'w') as f:
-            json.dump(queue_data, f, indent=2)
-    
-    def add_to_queue(self, url, source='mobile'):
-        queue_data = self.load_queue()
+    def _import_legacy_queue(self):
+        """One-time conversion of the JSON queue file into the JSONL log"""
+        if os.path.exists(self.queue_file) or not os.path.exists(self.legacy_queue_file):
+            return
         
+        with open(self.legacy_queue_file, 'rb') as f:
+            queue_data = json_io.loads(f.read())
+        with open(self.queue_file, 'wb') as f:
+            f.writelines(json_io.dumps(item) + b'\n' for item in queue_data)
+    
+    async def add_to_queue(self, url, source='mobile'):
         # Check for duplicates
-        for item in queue_data:
-            if item['url'] == url and item['status'] != 'failed':
-                return {'success': False, 'error': 'URL already in queue'}
+        if url in self.urls:
+            return {'success': False, 'error': 'URL already in queue'}
         
         new_item = {
-            'id': int(datetime.now().timestamp() * 1000),
+            'id': next(self._ids),
             'url': url,
             'source': source,
             'status': 'pending',
@@ -280,85 +346,203 @@ class MobileQueue:
             'processing_attempts': 0
         }
         
-        queue_data.append(new_item)
-        self.save_queue(queue_data)
+        self.items[new_item['id']] = new_item
+        self.urls.add(url)
+        self.counts['pending'] += 1
+        self.recent.append(new_item)
+        self._log.write(json_io.dumps(new_item) + b'\n')
         
         return {'success': True, 'id': new_item['id']}
     
-    def get_queue_status(self):
-        queue_data = self.load_queue()
+    def transition(self, item_id, new_status):
+        """Move a queued item to a new status, keeping counts and the URL set current"""
+        item = self.items[item_id]
+        self.counts[item['status']] -= 1
+        self.counts[new_status] += 1
+        item['status'] = new_status
+        
+        # Failed listings may be submitted again
+        if new_status == 'failed':
+            self.urls.discard(item['url'])
+        else:
+            self.urls.add(item['url'])
+        
+        self._log.write(json_io.dumps({'id': item_id, 'status': new_status}) + b'\n')
+    
+    async def get_queue_status(self):
+        return {
+            'total': len(self.items),
+            'pending_count': self.counts['pending'],
+            'processing_count': self.counts['processing'],
+            'completed_count': self.counts['completed'],
+            'failed_count': self.counts['failed'],
+            'recent_items': list(self.recent)  # Last 5 items
+        }
+
+class RedisMobileQueue:
+    """Queue kept in Redis: a list of pending items plus a set of queued URLs"""
+    PENDING_KEY = 'queue:pending'
+    URLS_KEY = 'queue:urls'
+    COUNTS_KEY = 'queue:counts'
+    NEXT_ID_KEY = 'queue:next_id'
+    
+    def __init__(self, client):
+        self.redis = client
+    
+    async def add_to_queue(self, url, source='mobile'):
+        # SADD reports whether the URL was new, so concurrent submissions can't both pass the check
+        if not await self.redis.sadd(self.URLS_KEY, url):
+            return {'success': False, 'error': 'URL already in queue'}
+        
+        new_item = {
+            'id': await self.redis.incr(self.NEXT_ID_KEY),
+            'url': url,
+            'source': source,
+            'status': 'pending',
+            'added_date': datetime.now().isoformat(),
+            'processing_attempts': 0
+        }
         
-        status_counts = {}
-        for item in queue_data:
-            status = item['status']
-            status_counts[status] = status_counts.get(status, 0) + 1
+        async with self.redis.pipeline() as pipe:
+            pipe.lpush(self.PENDING_KEY, json_io.dumps(new_item))
+            pipe.hincrby(self.COUNTS_KEY, 'pending', 1)
+            await pipe.execute()
+        
+        return {'success': True, 'id': new_item['id']}
+    
+    async def get_queue_status(self):
+        async with self.redis.pipeline() as pipe:
+            pipe.llen(self.PENDING_KEY)
+            pipe.hgetall(self.COUNTS_KEY)
+            pipe.lrange(self.PENDING_KEY, 0, 4)
+            pending_count, status_counts, recent = await pipe.execute()
         
         return {
-            'total': len(queue_data),
-            'pending_count': status_counts.get('pending', 0),
-            'processing_count': status_counts.get('processing', 0),
-            'completed_count': status_counts.get('completed', 0),
-            'failed_count': status_counts.get('failed', 0),
-            'recent_items': queue_data[-5:]  # Last 5 items
+            'total': sum(int(count) for count in status_counts.values()),
+            'pending_count': pending_count,
+            'processing_count': int(status_counts.get('processing', 0)),
+            'completed_count': int(status_counts.get('completed', 0)),
+            'failed_count': int(status_counts.get('failed', 0)),
+            'recent_items': [json_io.loads(item) for item in reversed(recent)]  # Last 5 items
         }
 
 # Initialize queue manager
-mobile_queue = MobileQueue()
+if QUEUE_BACKEND == 'redis' and redis is not None:
+    mobile_queue = RedisMobileQueue(redis.Redis.from_url(REDIS_URL, decode_responses=True))
+else:
+    mobile_queue = MobileQueue()
+
+executor = ThreadPoolExecutor(max_workers=EXECUTOR_MAX_WORKERS, thread_name_prefix='mobile-processing')
 
-@app.route('/')
-def mobile_landing():
+processing_requested = asyncio.Event()
+batch_ready = asyncio.Event()
+submissions_since_run = 0
+
+_status_cache = {'time': float('-inf'), 'body': b'', 'etag': ''}
+
+async def mobile_landing(request):
     """Mobile-friendly landing page"""
-    return MOBILE_LANDING_PAGE
+    # Each encoding is its own representation with its own ETag
+    if 'gzip' in request.headers.get('Accept-Encoding', ''):
+        body, etag = LANDING_PAGE_GZ, LANDING_GZ_ETAG
+        headers = {'Content-Encoding': 'gzip'}
+    else:
+        body, etag = LANDING_PAGE_BYTES, LANDING_ETAG
+        headers = {}
+    headers.update({'ETag': etag, 'Cache-Control': LANDING_CACHE_CONTROL, 'Vary': 'Accept-Encoding'})
+    
+    if etag_matches(request, etag):
+        headers.pop('Content-Encoding', None)
+        return web.Response(status=304, headers=headers)
+    
+    return web.Response(body=body, content_type='text/html', charset='utf-8', headers=headers)
 
-@app.route('/api/add-listing', methods=['POST'])
-def add_listing():
+async def add_listing(request):
     """Add URL to processing queue"""
     try:
-        data = request.json
+        data = json_io.loads(await request.read())
         url = data.get('url')
         source = data.get('source', 'mobile')
         
         if not url:
-            return jsonify({'error': 'URL is required'}), 400
+            return json_response({'error': 'URL is required'}, status=400)
         
         if 'facebook.com/marketplace' not in url:
-            return jsonify({'error': 'Must be a Facebook Marketplace URL'}), 400
+            return json_response({'error': 'Must be a Facebook Marketplace URL'}, status=400)
         
-        result = mobile_queue.add_to_queue(url, source)
+        result = await mobile_queue.add_to_queue(url, source)
         
         if result['success']:
+            # The submitter refreshes its count right away, so don't serve it the cached one
+            _status_cache['time'] = float('-inf')
+            
             # Trigger background processing (optional)
-            threading.Thread(target=trigger_processing, daemon=True).start()
+            request_processing()
             
-            return jsonify({
+            return json_response({
                 'success': True, 
                 'id': result['id'],
                 'message': 'Added to processing queue'
             })
         else:
-            return jsonify({'error': result['error']}), 400
+            return json_response({'error': result['error']}, status=400)
             
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return json_response({'error': str(e)}, status=500)
 
-@app.route('/api/queue-status')
-def queue_status():
+async def queue_status(request):
     """Get current queue status"""
     try:
-        status = mobile_queue.get_queue_status()
-        return jsonify(status)
+        now = time.monotonic()
+        if now - _status_cache['time'] >= STATUS_CACHE_TTL:
+            body = json_io.dumps(await mobile_queue.get_queue_status())
+            _status_cache.update(time=now, body=body, etag='"' + hashlib.sha256(body).hexdigest() + '"')
+        
+        headers = {'ETag': _status_cache['etag'], 'Cache-Control': 'no-cache'}
+        if etag_matches(request, _status_cache['etag']):
+            return web.Response(status=304, headers=headers)
+        
+        return web.Response(body=_status_cache['body'], content_type='application/json', headers=headers)
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return json_response({'error': str(e)}, status=500)
 
-@app.route('/api/process-queue', methods=['POST'])
-def process_queue():
+async def process_queue(request):
     """Manual trigger for queue processing"""
     try:
         # This could trigger the enhanced screenshot collector
         # For now, just return success
-        return jsonify({'success': True, 'message': 'Queue processing triggered'})
+        return json_response({'success': True, 'message': 'Queue processing triggered'})
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return json_response({'error': str(e)}, status=500)
+
+def request_processing():
+    """Ask for the queue to be processed with the next batch"""
+    global submissions_since_run
+    submissions_since_run += 1
+    processing_requested.set()
+    if submissions_since_run >= PROCESSING_MIN_BATCH:
+        batch_ready.set()
+
+async def run_processing_batches():
+    """Run trigger_processing once per batch of submissions instead of once per URL"""
+    global submissions_since_run
+    loop = asyncio.get_running_loop()
+    
+    while True:
+        await processing_requested.wait()
+        try:
+            await asyncio.wait_for(batch_ready.wait(), PROCESSING_DEBOUNCE)
+        except asyncio.TimeoutError:
+            pass
+        
+        processing_requested.clear()
+        batch_ready.clear()
+        submissions_since_run = 0
+        
+        try:
+            await loop.run_in_executor(executor, trigger_processing)
+        except Exception as e:
+            print(f"❌ Queue processing failed: {e}")
 
 def trigger_processing():
     """Background processing trigger"""
@@ -366,14 +550,27 @@ def trigger_processing():
     # Implementation depends on your preferred workflow
     pass
 
+app.router.add_get('/', mobile_landing)
+app.router.add_post('/api/add-listing', add_listing)
+app.router.add_get('/api/queue-status', queue_status)
+app.router.add_post('/api/process-queue', process_queue)
+
+async def processing_batches(app):
+    """Run the batch submitter for the lifetime of the server"""
+    task = asyncio.create_task(run_processing_batches())
+    yield
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    executor.shutdown(wait=False)
+
+app.cleanup_ctx.append(processing_batches)
+
 if __name__ == '__main__':
     print("🚀 Starting Mobile Integration Server...")
     print("📱 Mobile interface: http://localhost:5000")
     print("🔄 Processing queue: http://localhost:5000/api/queue-status")
     
-    # Create initial queue file if it doesn't exist
-    if not os.path.exists('mobile_processing_queue.json'):
-        with open('mobile_processing_queue.json', 'w') as f:
-            json.dump([], f)
-    
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    web.run_app(app, host='0.0.0.0', port=5000, loop=uvloop.new_event_loop() if uvloop else None)
@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""
+Request Rate Limiter
+Token bucket that paces Facebook requests for the screenshot collectors.
+"""
+
+import asyncio
+import time
+
+class RateLimiter:
+    """Token bucket shared by concurrent tasks to pace requests to Facebook"""
+    
+    def __init__(self, rate, burst):
+        self.rate = rate  # Tokens added per second
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+    
+    async def acquire(self):
+        """Wait until a request may be sent"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                
+                await asyncio.sleep((1 - self.tokens) / self.rate)
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+Bounded Async Task Pool
+Caps how many coroutines run at once for the mobile queue and Supabase migration.
+"""
+
+import asyncio
+import os
+
+# Default cap on tasks in flight
+DEFAULT_TASK_LIMIT = min(32, (os.cpu_count() or 1) * 4)
+
+async def limited_gather(coro_factories, limit=DEFAULT_TASK_LIMIT):
+    """Run coroutines from zero-argument factories, at most `limit` at a time.
+    
+    A factory is only pulled once a slot is free, so a lazy iterable (e.g. batches
+    read from a stream) is never read ahead of the work. Results are not kept;
+    the first task to fail cancels the rest and its exception is raised.
+    """
+    pending = set()
+    try:
+        for factory in coro_factories:
+            pending.add(asyncio.ensure_future(factory()))
+            if len(pending) >= limit:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    task.result()
+        
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_EXCEPTION)
+            for task in done:
+                task.result()
+    except BaseException:
+        for task in pending:
+            task.cancel()
+        raise